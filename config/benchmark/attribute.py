@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+单个配置项读取耗时对比: _Dict属性/下标、freeze只读视图、slots记录、一般dict
+python attribute.py [读取次数]  默认 1000000
+"""
+
+import sys
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+
+class Database:
+    host: str
+    port: int = 3306
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    data = {'host': '127.0.0.1', 'port': 3306}
+    node = config.read_config(data=dict(data))
+    frozen = config.freeze(node)
+    record = config.read_config(data=dict(data), expect=Database, slots=True)
+    plain = dict(data)
+    loop = range(n)
+
+    def read_attr(d):
+        def read():
+            for _ in loop:
+                d.host
+        return read
+
+    def read_item(d):
+        def read():
+            for _ in loop:
+                d['host']
+        return read
+
+    print('-- %d reads' % n)
+    cases = [
+        ('dict[key]', read_item(plain)),
+        ('_Dict[key]', read_item(node)),
+        ('_Dict.attr', read_attr(node)),
+        ('freeze().attr', read_attr(frozen)),
+        ('slots record.attr', read_attr(record)),
+    ]
+    base = None
+    for name, fn in cases:
+        seconds = bench(fn, number=1)
+        report(name, seconds, base)
+        base = base or seconds
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+快照缓存命中/未命中的read_config耗时对比(json/yaml)
+python cache.py [条目数]  默认 20000
+"""
+
+import os
+import sys
+import tempfile
+from typing import List
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+
+class Item:
+    id: int
+    name: str = 'item'
+    enable: bool = True
+    tags: List[str] = []
+
+
+class Schema:
+    rows: List[Item]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = {'rows': [{'id': str(i), 'tags': ['a', 'b']} for i in range(n)]}
+    tmp = tempfile.mkdtemp()
+    for suffix in ('.json', '.yaml'):
+        path = os.path.join(tmp, 'fixture' + suffix)
+        with open(path, mode='wt', encoding='utf-8') as f:
+            config.dump_data(data, path, f)
+        run(path, n)
+
+
+def run(path: str, n: int):
+    def miss():
+        if os.path.exists(config.cache_path(path)):
+            os.remove(config.cache_path(path))
+        config.read_config(raw_path=path, expect=Schema, cache=True)
+
+    print('-- %s %d rows' % (os.path.splitext(path)[1], n))
+    base = bench(lambda: config.read_config(raw_path=path, expect=Schema), number=1)
+    report('no cache', base)
+    report('cache miss (parse + write)', bench(miss, number=1), base)
+    config.read_config(raw_path=path, expect=Schema, cache=True)
+    report('cache hit', bench(lambda: config.read_config(raw_path=path, expect=Schema, cache=True), number=1), base)
+    report('cache hit lazy', bench(lambda: config.read_config(raw_path=path, expect=Schema, cache=True, lazy=True),
+                                   number=1), base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Cmd 从命令行取值: 逐个扫描 sys.argv (此前的实现) 与参数索引的耗时对比
+python cmd.py [字段数] [参数数]  默认 500 5000
+"""
+
+import sys
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+
+def scan(cmd):
+    """
+    此前的实现: 每个字段最多四次线性扫描
+    """
+    index = cmd.key in sys.argv and sys.argv.index(cmd.key) \
+        or cmd.short and cmd.short in sys.argv and sys.argv.index(cmd.short)
+    return sys.argv[index + 1] if index else None
+
+
+def main():
+    fields = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    args = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    cmds = [config.Cmd('field_%d' % i, short=False) for i in range(fields)]
+    sys.argv = ['prog'] + [a for i in range(args) for a in ('-arg_%d' % i, str(i))] + ['-field_0', 'x']
+
+    print('-- %d fields, %d argv' % (fields, len(sys.argv)))
+    base = bench(lambda: [scan(cmd) for cmd in cmds], number=1)
+    report('scan', base)
+    report('index (cached)', bench(lambda: [cmd.get_value() for cmd in cmds], number=1), base)
+
+    def rebuild():
+        config.Cmd.refresh()
+        return [cmd.get_value() for cmd in cmds]
+
+    report('index (rebuild once)', bench(rebuild, number=1), base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark公共方法
+config.py 导入时会读取工作目录下的config文件，因此在临时目录中导入
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config_module():
+    """
+    导入上级目录的config.py
+    :return: config模块
+    """
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, 'config.yaml'), mode='wt', encoding='utf-8') as f:
+        f.write('{}\n')
+    sys.path.insert(0, ROOT)
+    os.chdir(tmp)
+    try:
+        import config
+    finally:
+        os.chdir(cwd)
+    return config
+
+
+def bench(fn, number: int = 100, repeat: int = 5) -> float:
+    """
+    :return: 单次调用的最佳耗时(秒)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def report(name: str, seconds: float, base: float = None):
+    line = '%-40s %10.3f ms' % (name, seconds * 1000)
+    if base:
+        line += '  x%.2f' % (base / seconds)
+    print(line)
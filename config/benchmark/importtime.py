@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+python -X importtime 测量导入 config.py / db.py 的耗时
+config.py 的全局 config 为 LazyConfig，导入时不再读取配置文件，
+"import + preload" 一项即为此前导入时的开销
+db.py 需要 aiomysql，导入时不读取数据库配置也不建立连接
+"""
+
+import os
+import re
+import sys
+import shutil
+import tempfile
+import subprocess
+
+from common import ROOT
+
+PACKAGE = os.path.dirname(ROOT)
+CONFIG = '\n'.join(['database:', '  host: 127.0.0.1', '  password: password', '  db: example'] +
+                   ['item_%d:' % i + '\n  value: %d\n  tags: [a, b, c]' % i for i in range(2000)])
+
+
+def importtime(code: str, module: str, cwd: str, repeat: int = 5):
+    """
+    :return: 模块导入的累计耗时(毫秒)，失败时返回错误信息
+    """
+    best = None
+    for _ in range(repeat):
+        r = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, capture_output=True, text=True,
+                           env=dict(os.environ, PYTHONPATH=cwd))
+        if r.returncode:
+            return r.stderr.strip().splitlines()[-1]
+        for line in r.stderr.splitlines():
+            m = re.match(r'import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$', line)
+            if m and m.group(3) == module and not m.group(2):
+                us = int(m.group(1))
+                best = us if best is None else min(best, us)
+    return best / 1000
+
+
+def walltime(code: str, cwd: str, repeat: int = 5) -> float:
+    timer = 'import time; _start = time.perf_counter(); %s; print(time.perf_counter() - _start)' % code
+    return min(float(subprocess.run([sys.executable, '-c', timer], cwd=cwd, capture_output=True, text=True,
+                                    env=dict(os.environ, PYTHONPATH=cwd)).stdout) for _ in range(repeat)) * 1000
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, 'config.yaml'), mode='wt', encoding='utf-8') as f:
+        f.write(CONFIG)
+    pkg = os.path.join(tmp, 'standard')
+    os.mkdir(pkg)
+    open(os.path.join(pkg, '__init__.py'), 'w').close()
+    shutil.copy(os.path.join(ROOT, 'config.py'), pkg)
+    shutil.copy(os.path.join(PACKAGE, 'db', 'db.py'), pkg)
+
+    for code, module in [('import standard.config', 'standard.config'), ('import standard.db', 'standard.db')]:
+        r = importtime(code, module, tmp)
+        print('%-40s %s' % (code, '%10.3f ms' % r if isinstance(r, float) else r))
+    print('%-40s %10.3f ms' % ('import + preload', walltime('import standard.config as c; c.config.preload()', tmp)))
+    print('%-40s %10.3f ms' % ('import only (wall)', walltime('import standard.config', tmp)))
+
+
+if __name__ == '__main__':
+    main()
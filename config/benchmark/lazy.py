@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+含大型查询表的配置，只访问其中一项时 lazy 与默认(全量转换)的耗时/内存对比
+"""
+
+import tracemalloc
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+
+def build(size: int = 20000) -> dict:
+    return {
+        'server': {'host': '127.0.0.1', 'port': 8000},
+        'table': {str(i): {'id': i, 'name': 'name%d' % i, 'tags': ['a', 'b']} for i in range(size)}
+    }
+
+
+def load(data, lazy):
+    cfg = config.read_config(data=data, lazy=lazy)
+    return cfg.table['42'].name
+
+
+def memory(data, lazy) -> int:
+    tracemalloc.start()
+    cfg = config.read_config(data=data, lazy=lazy)
+    cfg.table['42'].name
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    data = build()
+    eager = bench(lambda: load(data, False), number=5)
+    lazy = bench(lambda: load(data, True), number=5)
+    report('read_config (load + one access)', eager)
+    report('read_config lazy (load + one access)', lazy, eager)
+    print('%-40s %10.1f KB' % ('memory', memory(data, False) / 1024))
+    print('%-40s %10.1f KB' % ('memory lazy', memory(data, True) / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+10层嵌套配置最深处 d[k] = v 的耗时(每1000次)，对比一般dict
+sync: 绑定同步上下文(interval较大，只测量标记修改的开销)
+"""
+
+import os
+import tempfile
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+DEPTH = 10
+NUMBER = 100000
+
+
+def build(depth: int = DEPTH) -> dict:
+    data = leaf = {}
+    for i in range(depth - 1):
+        leaf['level'] = {}
+        leaf = leaf['level']
+    return data
+
+
+def deepest(d):
+    for _ in range(DEPTH - 1):
+        d = d['level']
+    return d
+
+
+def main():
+    plain = deepest(build())
+    unsynced = deepest(config.config2obj(build()))
+    root = config.config2obj(build())
+    context = config.sync(root, raw_path=os.path.join(tempfile.mkdtemp(), 'bench.json'), interval=3600)
+    synced = deepest(root)
+
+    def set_plain():
+        for i in range(NUMBER):
+            plain['k'] = i
+
+    def set_unsynced():
+        for i in range(NUMBER):
+            unsynced['k'] = i
+
+    def set_synced():
+        for i in range(NUMBER):
+            synced['k'] = i
+
+    # 以每1000次赋值的耗时输出
+    per = NUMBER / 1000
+    report('dict d[k] = v', bench(set_plain, number=1) / per)
+    report('_Dict d[k] = v (no sync)', bench(set_unsynced, number=1) / per)
+    report('_Dict d[k] = v (sync)', bench(set_synced, number=1) / per)
+    context.close()
+
+
+if __name__ == '__main__':
+    main()
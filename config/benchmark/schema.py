@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+config2expect(逐次解析类标注) 与 compile_expect(编译后的校验计划) 的加载耗时对比
+schema: 20个子配置 * 10个字段 = 200个字段
+"""
+
+from typing import List, Dict, Optional
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+FIELD_TYPES = [
+    (str, 'value'),
+    (int, '3600 * 8'),
+    (bool, 1),
+    (List[int], [1, 2, 3]),
+    (Dict[str, int], {'a': 1, 'b': 2}),
+    (Optional[str], None),
+    (str, None),  # 使用默认值
+    (int, 7),
+    (List[str], ['a', 'b']),
+    (float, 1.5),
+]
+
+
+def build_schema(sections: int = 20):
+    annotations, data = {}, {}
+    for i in range(sections):
+        sub_annotations, sub_default, sub_data = {}, {}, {}
+        for j, (_type, value) in enumerate(FIELD_TYPES):
+            k = 'field_%d' % j
+            if _type == float:
+                # float非内置预期类，作为无标注默认值处理
+                sub_default[k] = value
+                continue
+            sub_annotations[k] = _type
+            if value is None and _type == str:
+                sub_default[k] = 'default'
+            else:
+                sub_data[k] = value
+        sub = type('Section%d' % i, (), dict(sub_default, __annotations__=sub_annotations))
+        annotations['section_%d' % i] = sub
+        data['section_%d' % i] = sub_data
+    return type('Schema', (), {'__annotations__': annotations}), data
+
+
+def main():
+    schema, data = build_schema()
+    assert config.config2expect(data, schema) == config.compile_expect(schema)(data)
+
+    before = bench(lambda: config.config2expect(data, schema), number=200)
+    after = bench(lambda: config.compile_expect(schema)(data), number=200)
+    report('config2expect (per load)', before)
+    report('compile_expect (per load)', after, before)
+
+
+if __name__ == '__main__':
+    main()
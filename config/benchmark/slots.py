@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+slots模式(Record)与默认_Dict的内存占用及属性读取耗时对比
+python slots.py [条目数]  默认 50000
+"""
+
+import sys
+import tracemalloc
+from typing import List
+
+from common import load_config_module, bench, report
+
+config = load_config_module()
+
+
+class Database:
+    host: str
+    port: int = 3306
+    user: str = 'root'
+    password: str = ''
+    db: str = 'example'
+
+
+class Schema:
+    databases: List[Database]
+
+
+def measure(n: int, slots: bool):
+    data = {'databases': [{'host': '10.0.%d.%d' % (i // 256 % 256, i % 256), 'port': 3306 + i % 10}
+                          for i in range(n)]}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cfg = config.read_config(data=data, expect=Schema, slots=slots)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return cfg, memory
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print('-- %d records' % n)
+    base_memory = base_read = None
+    for slots in (False, True):
+        cfg, memory = measure(n, slots)
+        databases = cfg.databases
+
+        def read():
+            for d in databases:
+                d.host
+                d.port
+
+        seconds = bench(read, number=1)
+        name = 'slots' if slots else '_Dict'
+        print('%-40s %10.1f MB  %6.0f B/record' % (name + ' memory', memory / 1024 / 1024, memory / n)
+              + ('  x%.2f' % (base_memory / memory) if base_memory else ''))
+        report(name + ' read 2 attrs/record', seconds, base_read)
+        base_memory, base_read = base_memory or memory, base_read or seconds
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+libyaml(C) 与 Python 实现的yaml读取/同步写入吞吐对比
+python yaml_backend.py [大小(MB) ...]  默认 1 10
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from common import load_config_module, report
+
+config = load_config_module()
+
+
+def fixture(path: str, mb: float) -> None:
+    """
+    生成约mb大小的yaml配置
+    """
+    items = {}
+    size, i = 0, 0
+    while size < mb * 1024 * 1024:
+        items['item_%d' % i] = {'id': i, 'name': 'name_%d' % i, 'enable': i % 2 == 0, 'ratio': i / 7,
+                                'tags': ['alpha', 'beta', 'gamma']}
+        size += 120
+        i += 1
+    config.set_yaml_backend('auto')
+    with open(path, mode='wt', encoding='utf-8') as f:
+        config.dump_data({'items': items}, path, f)
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [float(i) for i in sys.argv[1:]] or [1, 10]
+    tmp = tempfile.mkdtemp()
+    for mb in sizes:
+        path = os.path.join(tmp, 'fixture_%s.yaml' % mb)
+        fixture(path, mb)
+        real = os.path.getsize(path) / 1024 / 1024
+        print('-- %.1f MB' % real)
+        base = {}
+        for backend in ('python', 'c'):
+            config.set_yaml_backend(backend)
+            cfg = None
+
+            def load():
+                nonlocal cfg
+                cfg = config.read_config(raw_path=path)
+
+            load_time = timed(load)
+            write_time = timed(lambda: config.write_file(path, cfg.dump()))
+            for name, t in (('load', load_time), ('sync write', write_time)):
+                report('%s %s (%.1f MB/s)' % (backend, name, real / t), t, base.get(name))
+                base.setdefault(name, t)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,19 +5,83 @@ StandardLibrary v1.7
 TODO support network file？
 """
 
-__all__ = ['config', 'read_config', 'sync', 'Cmd']
+__all__ = ['config', 'read_config', 'sync', 'Cmd', 'compile_expect', 'LazyConfig', 'set_yaml_backend', 'config_origin',
+           'watch', 'freeze', 'stream_data']
 
 import os
 import re
 import sys
 import json
+import time
+import marshal
+import hashlib
+import atexit
+import shutil
+import weakref
+import select
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
 # 从typing导入类提示的基类，以判断类提示
 from typing import _GenericAlias, Union, Optional, List, Any
 
-try:
-    import yaml
-except ImportError as yaml_import_error:
-    yaml = None
+# 首次读写yaml时才导入，见_yaml
+yaml = None
+# yaml后端 auto: 可用时使用libyaml(C) / c / python，见set_yaml_backend
+yaml_backend = os.environ.get('CONFIG_YAML_BACKEND', 'auto')
+
+
+def _yaml():
+    """
+    导入yaml，未安装时抛出ImportError
+    """
+    global yaml
+    if yaml is None:
+        import yaml as module
+        yaml = module
+    return yaml
+
+
+def set_yaml_backend(backend: str = 'auto') -> None:
+    """
+    指定读写yaml使用的实现，也可通过环境变量 CONFIG_YAML_BACKEND 指定
+    :param backend: auto: libyaml可用时使用C实现，否则使用Python实现 / c: 强制C实现 / python: 强制Python实现
+    """
+    global yaml_backend
+    if backend not in ('auto', 'c', 'python'):
+        raise ValueError(f'unknown yaml backend {backend}')
+    yaml_backend = backend
+    if backend == 'c':
+        _yaml_c()
+
+
+def _yaml_c() -> bool:
+    """
+    :return: 是否使用libyaml(C)实现
+    """
+    module = _yaml()
+    if yaml_backend == 'python':
+        return False
+    elif getattr(module, '__with_libyaml__', False):
+        return True
+    elif yaml_backend == 'c':
+        raise ImportError('yaml is not built with libyaml')
+    else:
+        return False
+
+
+def _yaml_loader():
+    """
+    与yaml.safe_load相同的Loader
+    """
+    return yaml.CSafeLoader if _yaml_c() else yaml.SafeLoader
+
+
+def _yaml_dumper():
+    """
+    与yaml.dump相同的Dumper
+    """
+    return yaml.CDumper if _yaml_c() else yaml.Dumper
 
 
 class ConfigError(Exception):
@@ -32,18 +96,81 @@ class ConfigError(Exception):
         self.reason = reason
 
 
+_MISSING = object()
+# 不可变类型，值相等即视为未修改
+_IMMUTABLE = (str, int, float, bool, type(None), tuple)
+
+
+def _unchanged(old, value) -> bool:
+    """
+    赋值是否无需上报: 同一配置节点(其内部修改已自行上报)或相等的不可变值
+    一般list/dict原地修改后重新赋值仍需上报
+    """
+    if old is value:
+        return isinstance(value, Propagate) or type(value) in _IMMUTABLE
+    return type(old) is type(value) and type(value) in _IMMUTABLE and old == value
+
+
 class Propagate:
     """
     基类，用于支持上报(文件同步)功能
+    _father为父配置，_context为整棵配置树共享的同步上下文，未同步时为None
+    修改时直接通知_context，无需逐级上溯
     """
-    _father: Optional['Propagate']
+    _father: Optional['Propagate'] = None
+    _context: Optional['Propagate'] = None
 
     def __init__(self, father: Optional['Propagate'] = None):
         self._father = father
+        if father is not None and father._context is not None:
+            self._context = father._context
 
     def _propagate(self):
-        if self._father is not None:
-            self._father._propagate()
+        context = self._context
+        if context is not None:
+            context._propagate(self)
+
+    def _attach(self, values, context: 'Propagate') -> None:
+        """
+        将新加入的配置对象挂到本节点及同步上下文下
+        """
+        for value in values:
+            if isinstance(value, Propagate) and value._context is not context:
+                object.__setattr__(value, '_father', self)
+                bind(value, context)
+
+    def batch(self):
+        """
+        批量修改，块内的修改在结束时合并为一次同步
+        e.g. with config.batch(): ...
+        """
+        if self._context is not None:
+            return self._context.batch()
+        return nullcontext(self)
+
+    def flush(self) -> None:
+        """
+        立即写入未同步的修改
+        """
+        if self._context is not None:
+            self._context.flush()
+
+
+def bind(config: Propagate, context: Optional[Propagate]) -> None:
+    """
+    将整棵配置树绑定到同步上下文
+    :param config: 配置对象
+    :param context: 同步上下文，需实现_propagate(node, key)，为None时解除绑定
+    """
+    stack = [config]
+    while stack:
+        node = stack.pop()
+        if context is None:
+            vars(node).pop('_context', None)
+        else:
+            object.__setattr__(node, '_context', context)
+        values = dict.values(node) if isinstance(node, dict) else list.__iter__(node)
+        stack.extend(v for v in values if isinstance(v, Propagate))
 
 
 class PropagateCallback(Propagate):
@@ -59,10 +186,566 @@ class PropagateCallback(Propagate):
         self.config = config
         self.callback = callback
 
-    def _propagate(self):
+    def _propagate(self, node=None, key=...):
         self.callback(self.config)
 
 
+def dump_data(data, path: str, f) -> None:
+    """
+    按文件后缀将数据序列化写入文件对象
+    :param data: 一般dict/list
+    :param path: 文件路径，用于判断格式
+    :param f: 文件对象
+    """
+    if path.endswith('.yaml'):
+        dumper = _yaml_dumper()
+        yaml.dump(data, f, Dumper=dumper)
+    elif path.endswith('.json'):
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    else:
+        raise TypeError(f'not support config file type {path}')
+
+
+def stream_data(data, path: str, f) -> None:
+    """
+    同dump_data，但直接遍历数据逐段写入，配置对象无需先dump为一般dict/list
+    yaml的键顺序/格式与yaml.dump一致
+    :param data: 配置对象/一般dict/list
+    :param path: 文件路径，用于判断格式
+    :param f: 文件对象
+    """
+    data = _unwrap(data)
+    if path.endswith('.yaml'):
+        dumper = _yaml_dumper()(f, default_flow_style=False, sort_keys=True)
+        try:
+            dumper.open()
+            dumper.emit(yaml.DocumentStartEvent(explicit=False))
+            _emit_yaml(dumper, data)
+            dumper.emit(yaml.DocumentEndEvent(explicit=False))
+            dumper.close()
+        finally:
+            dumper.dispose()
+    elif path.endswith('.json'):
+        chunks = []
+        for chunk in _json_encoder.iterencode(data):
+            chunks.append(chunk)
+            if len(chunks) >= 1024:
+                f.write(''.join(chunks))
+                chunks.clear()
+        f.write(''.join(chunks))
+    else:
+        raise TypeError(f'not support config file type {path}')
+
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+
+def _emit_yaml(dumper, data) -> None:
+    if isinstance(data, dict):
+        items = dict.items(data)
+        try:
+            items = sorted(items)
+        except TypeError:
+            pass
+        dumper.emit(yaml.MappingStartEvent(None, None, True, flow_style=False))
+        for k, v in items:
+            _emit_yaml(dumper, k)
+            _emit_yaml(dumper, v)
+        dumper.emit(yaml.MappingEndEvent())
+    elif isinstance(data, list):
+        dumper.emit(yaml.SequenceStartEvent(None, None, True, flow_style=False))
+        for v in list.__iter__(data):
+            _emit_yaml(dumper, v)
+        dumper.emit(yaml.SequenceEndEvent())
+    else:
+        # 标量交由Representer处理，每个标量单独序列化，不产生锚点
+        _emit_node(dumper, dumper.represent_data(data))
+        dumper.represented_objects, dumper.object_keeper = {}, []
+
+
+def _emit_node(dumper, node) -> None:
+    """
+    同Serializer.serialize_node(不含锚点)，C/Python的Emitter均可使用
+    """
+    if isinstance(node, yaml.ScalarNode):
+        implicit = (node.tag == dumper.resolve(yaml.ScalarNode, node.value, (True, False)),
+                    node.tag == dumper.resolve(yaml.ScalarNode, node.value, (False, True)))
+        dumper.emit(yaml.ScalarEvent(None, node.tag, implicit, node.value, style=node.style))
+    elif isinstance(node, yaml.SequenceNode):
+        implicit = node.tag == dumper.resolve(yaml.SequenceNode, node.value, True)
+        dumper.emit(yaml.SequenceStartEvent(None, node.tag, implicit, flow_style=node.flow_style))
+        for item in node.value:
+            _emit_node(dumper, item)
+        dumper.emit(yaml.SequenceEndEvent())
+    else:
+        implicit = node.tag == dumper.resolve(yaml.MappingNode, node.value, True)
+        dumper.emit(yaml.MappingStartEvent(None, node.tag, implicit, flow_style=node.flow_style))
+        for k, v in node.value:
+            _emit_node(dumper, k)
+            _emit_node(dumper, v)
+        dumper.emit(yaml.MappingEndEvent())
+
+
+def write_file(path: str, data, stream: bool = False) -> None:
+    """
+    原子写入：先写入同目录临时文件，再用os.replace替换，中途崩溃不会留下写了一半的配置
+    :param path: 文件路径
+    :param data: 一般dict/list，stream时可为配置对象
+    :param stream: 是否使用stream_data直接写入
+    """
+    fd, tmp = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path), suffix='.tmp',
+                               dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, mode='wt', encoding='utf-8') as f:
+            (stream_data if stream else dump_data)(data, path, f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    # 全量写入后日志已合并，删除前崩溃时日志头与新配置文件不符，读取时会被忽略(见read_journal)
+    if os.path.exists(journal_path(path)):
+        os.remove(journal_path(path))
+
+
+def journal_path(path: str) -> str:
+    """
+    增量同步日志(JSON Patch)路径，与配置文件同目录
+    """
+    return path + '.journal'
+
+
+def _pointer(path: tuple) -> str:
+    return ''.join('/' + str(k).replace('~', '~0').replace('/', '~1') for k in path)
+
+
+def snapshot_id(path: str) -> Optional[list]:
+    """
+    配置文件标识 [大小, 修改时间(ns), sha1]，日志首行记录其所基于的配置文件
+    全量写入通过os.replace生成新文件，标识随配置文件原子地改变
+    :return: 文件不存在时为None
+    """
+    try:
+        with open(path, mode='rb') as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return [len(data), mtime, hashlib.sha1(data).hexdigest()]
+
+
+def append_journal(path: str, ops: list) -> None:
+    """
+    追加JSON Patch操作到日志，每行一个操作，新日志首行为 {"snapshot": 配置文件标识}
+    :param path: 配置文件路径
+    :param ops: JSON Patch操作
+    """
+    header = ''
+    if not os.path.exists(journal_path(path)) or not os.path.getsize(journal_path(path)):
+        header = json.dumps({'snapshot': snapshot_id(path)}) + '\n'
+    with open(journal_path(path), mode='at', encoding='utf-8') as f:
+        f.write(header + ''.join(json.dumps(op, ensure_ascii=False) + '\n' for op in ops))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_journal(path: str) -> list:
+    """
+    读取日志中的JSON Patch操作，忽略末尾写了一半的行
+    日志首行记录的配置文件标识与当前不符时，为全量写入后未及删除的旧日志，忽略
+    :param path: 配置文件路径
+    """
+    ops = []
+    try:
+        with open(journal_path(path), mode='rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break
+                if not ops and 'op' not in op and 'snapshot' in op:
+                    if op['snapshot'] != snapshot_id(path):
+                        return []
+                    continue
+                ops.append(op)
+    except FileNotFoundError:
+        pass
+    return ops
+
+
+def apply_patch(data, ops: list):
+    """
+    应用JSON Patch(add/replace/remove)，路径不存在的操作会被忽略
+    :param data: 一般dict/list，会被原地修改
+    :param ops: JSON Patch操作
+    :return: 应用后的数据(根路径被替换时为新值)
+    """
+    for op in ops:
+        keys = [k.replace('~1', '/').replace('~0', '~') for k in op['path'].split('/')[1:]]
+        if not keys:
+            if op['op'] != 'remove':
+                data = op['value']
+            continue
+        try:
+            node = data
+            for k in keys[:-1]:
+                node = node[int(k)] if isinstance(node, list) else node[k]
+            k = keys[-1]
+            if isinstance(node, list):
+                if op['op'] == 'remove':
+                    del node[int(k)]
+                elif op['op'] == 'replace':
+                    node[int(k)] = op['value']
+                elif k == '-':
+                    node.append(op['value'])
+                else:
+                    node.insert(int(k), op['value'])
+            elif op['op'] == 'remove':
+                node.pop(k, None)
+            else:
+                node[k] = op['value']
+        except (KeyError, IndexError, ValueError, TypeError):
+            continue
+    return data
+
+
+class SyncWriter:
+    """
+    后台写入线程，序列化与写入均在专用线程中进行
+    同一文件只保留最新的待写入快照，被覆盖的快照直接丢弃
+    增量日志在有待写入快照时直接合并到快照中，否则累积后一次追加
+    """
+
+    def __init__(self):
+        self.writes = 0  # 写入次数
+        self.dropped = 0  # 被新快照覆盖而丢弃的次数
+        self.errors = 0  # 写入失败次数
+        self.last_latency = 0.
+        self.max_latency = 0.
+        self.total_latency = 0.
+        self._pending = {}  # path -> (是否全量, 快照/JSON Patch操作)
+        self._writing = None
+        self._failed = {}  # path -> 最近一次写入异常
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        待写入的快照数(含正在写入的)
+        """
+        return len(self._pending) + (self._writing is not None)
+
+    def submit(self, path: str, data) -> None:
+        """
+        提交快照，立即返回
+        :param path: 文件路径
+        :param data: 一般dict/list，提交后不应再修改
+        """
+        with self._cond:
+            if path in self._pending:
+                self.dropped += 1
+            self._pending[path] = (True, data)
+            self._notify()
+
+    def submit_patch(self, path: str, ops: list) -> None:
+        """
+        提交增量日志，立即返回
+        :param path: 配置文件路径
+        :param ops: JSON Patch操作，提交后不应再修改
+        """
+        with self._cond:
+            pending = self._pending.get(path)
+            if pending is None:
+                self._pending[path] = (False, list(ops))
+            elif pending[0]:
+                self._pending[path] = (True, apply_patch(pending[1], ops))
+            else:
+                pending[1].extend(ops)
+            self._notify()
+
+    def _notify(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='config-sync-writer', daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def wait(self, path: str = None, timeout: float = None) -> bool:
+        """
+        等待写入完成，并抛出该文件最近一次写入的异常
+        :param path: 文件路径，为None时等待全部
+        :param timeout: 超时(秒)
+        :return: 是否在超时前完成
+        """
+        with self._cond:
+            if path is None:
+                done = self._cond.wait_for(lambda: not self._pending and self._writing is None, timeout)
+            else:
+                done = self._cond.wait_for(lambda: path not in self._pending and self._writing != path, timeout)
+            err = self._failed.pop(path, None) if path is not None else None
+        if err is not None:
+            raise err
+        return done
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'writes': self.writes,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'avg_latency': self.total_latency / self.writes if self.writes else 0.
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                path = next(iter(self._pending))
+                full, data = self._pending.pop(path)
+                self._writing = path
+            start = time.perf_counter()
+            err = None
+            try:
+                if full:
+                    write_file(path, data)
+                else:
+                    append_journal(path, data)
+            except Exception as e:
+                err = e
+            latency = time.perf_counter() - start
+            with self._cond:
+                self._writing = None
+                if err is None:
+                    self.writes += 1
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.total_latency += latency
+                    self._failed.pop(path, None)
+                else:
+                    self.errors += 1
+                    self._failed[path] = err
+                self._cond.notify_all()
+
+
+sync_writer = SyncWriter()
+
+
+def _child(father, k):
+    """
+    获取子配置，不存在时返回...
+    """
+    try:
+        return dict.__getitem__(father, k) if isinstance(father, dict) else list.__getitem__(father, k)
+    except (KeyError, IndexError, TypeError):
+        return ...
+
+
+class SyncContext(Propagate):
+    """
+    文件同步上下文，配置树中的每个节点都直接引用它以接收修改事件
+    interval为0时每次修改立即写入，否则修改仅标记为脏，
+    在间隔结束/batch块结束/flush/进程退出时合并为一次写入
+    background时快照交由sync_writer在后台线程写入
+    journal时记录修改的键路径，只将变更的子树以JSON Patch追加到日志，
+    日志操作数超过compact时全量写入配置文件并清空日志
+    """
+
+    def __init__(self, config, path: str, interval: float = 0, background: bool = True, journal: bool = False,
+                 compact: int = 1000):
+        """
+        :param config: 配置对象
+        :param path: 文件路径
+        :param interval: 合并写入的间隔(秒)
+        :param background: 是否在后台线程写入
+        :param journal: 是否增量写入日志，仅支持.json
+        :param compact: 日志操作数上限，超过时合并到配置文件
+        """
+        if journal and not path.endswith('.json'):
+            raise TypeError(f'journal only support .json config {path}')
+        self.config = config
+        self.path = path
+        self.interval = interval
+        self.background = background
+        self.journal = journal
+        self.compact = compact
+        self.dirty = False
+        self._changes = {}  # 修改的键路径，有序集合
+        self._journaled = 0  # 日志中的操作数
+        self._full = True  # 下次是否需全量写入
+        self._depth = 0
+        self._timer = None
+        self._lock = threading.RLock()
+        _sync_contexts.add(self)
+
+    def _propagate(self, node=None, key=...):
+        """
+        :param node: 被修改的节点，None为根节点
+        :param key: 被修改的键，...表示节点整体被修改
+        """
+        with self._lock:
+            self.dirty = True
+            if self.journal and not self._full:
+                path = self._path(node, key)
+                if path == ():
+                    self._full = True
+                elif path is not None:
+                    self._changes[path] = None
+            if self._depth:
+                return
+            if not self.interval:
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _path(self, node, key=...) -> Optional[tuple]:
+        """
+        计算节点到根配置的键路径，节点已不在配置树中时返回None
+        节点在父配置中的键缓存于_key，失效时重新查找
+        """
+        keys = [] if key is ... else [key]
+        if node is None:
+            return tuple(keys)
+        root = self.config
+        while node is not root:
+            father = node._father
+            if father is None:
+                return None
+            k = vars(node).get('_key', ...)
+            if _child(father, k) is not node:
+                items = dict.items(father) if isinstance(father, dict) else enumerate(list.__iter__(father))
+                for k, v in items:
+                    if v is node:
+                        break
+                else:
+                    return None
+                object.__setattr__(node, '_key', k)
+            keys.append(k)
+            node = father
+        keys.reverse()
+        return tuple(keys)
+
+    def _ops(self) -> list:
+        """
+        将修改的键路径合并为JSON Patch操作，已被祖先路径覆盖的路径会被忽略
+        """
+        paths = sorted(self._changes, key=len)
+        self._changes.clear()
+        kept = set()
+        ops = []
+        for path in paths:
+            if any(path[:i] in kept for i in range(1, len(path))):
+                continue
+            kept.add(path)
+            father = self.config
+            for k in path[:-1]:
+                father = _child(father, k)
+            value = _child(father, path[-1])
+            if father is ...:
+                continue
+            elif value is ...:
+                if isinstance(father, dict):
+                    ops.append({'op': 'remove', 'path': _pointer(path)})
+            else:
+                ops.append({
+                    'op': 'replace' if isinstance(father, list) else 'add',
+                    'path': _pointer(path),
+                    'value': value.dump() if isinstance(value, Propagate) else value
+                })
+        return ops
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self._write()
+        except RuntimeError:
+            # 配置正在其他线程中修改(changed size during iteration)，下个间隔重试
+            self._propagate()
+
+    def _write(self):
+        """
+        在当前线程生成快照/日志，写入交由后台线程/当前线程完成
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.dirty:
+                return
+            self.dirty = False
+            try:
+                if self.journal and not self._full:
+                    ops = self._ops()
+                    if self._journaled + len(ops) <= self.compact:
+                        self._journaled += len(ops)
+                        if not ops:
+                            pass
+                        elif self.background:
+                            sync_writer.submit_patch(self.path, ops)
+                        else:
+                            append_journal(self.path, ops)
+                        return
+                if self.background:
+                    sync_writer.submit(self.path, self.config.dump())
+                else:
+                    write_file(self.path, self.config, stream=True)
+                self._full = False
+                self._changes.clear()
+                self._journaled = 0
+            except BaseException:
+                self.dirty = True
+                self._full = True
+                raise
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._depth += 1
+        try:
+            yield self.config
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if not self._depth:
+                    self._write()
+
+    def flush(self) -> None:
+        self._write()
+        if self.background:
+            sync_writer.wait(self.path)
+
+    def close(self) -> None:
+        """
+        写入剩余修改(日志合并到配置文件)并解除绑定
+        """
+        with self._lock:
+            if self._journaled:
+                self.dirty = self._full = True
+        self.flush()
+        _sync_contexts.discard(self)
+        if self.config._context is self:
+            bind(self.config, None)
+
+
+# 进程退出时写入所有未同步的修改
+_sync_contexts = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all() -> None:
+    for context in list(_sync_contexts):
+        context.flush()
+    sync_writer.wait()
+
+
 class _List(Propagate, list):
     """
     list类，添加propagate方法以支持上报
@@ -77,40 +760,60 @@ class _List(Propagate, list):
         return list.__getitem__(self, item)
 
     def __setitem__(self, key, value):
-        super(self).__setitem__(key, value)
-        self._propagate()
-
-    def pop(self, index: int = ...):
-        r = super().pop(index)
-        self._propagate()
+        if isinstance(key, slice):
+            # 切片赋值的值可为生成器等只能遍历一次的对象，先转为list再赋值及挂载
+            value = list(value)
+        list.__setitem__(self, key, value)
+        context = self._context
+        if context is not None:
+            self._attach(value if isinstance(key, slice) else (value,), context)
+            context._propagate(self)
+
+    def pop(self, index: int = -1):
+        r = list.pop(self, index)
+        if self._context is not None:
+            self._context._propagate(self)
         return r
 
     def append(self, object) -> None:
-        super().append(object)
-        self._propagate()
+        list.append(self, object)
+        context = self._context
+        if context is not None:
+            self._attach((object,), context)
+            context._propagate(self)
 
     def remove(self, object) -> None:
-        super().remove(object)
-        self._propagate()
+        list.remove(self, object)
+        if self._context is not None:
+            self._context._propagate(self)
 
     def reverse(self) -> None:
-        super().reverse()
-        self._propagate()
+        list.reverse(self)
+        if self._context is not None:
+            self._context._propagate(self)
 
     def insert(self, index: int, object) -> None:
-        super().insert(index, object)
-        self._propagate()
+        list.insert(self, index, object)
+        context = self._context
+        if context is not None:
+            self._attach((object,), context)
+            context._propagate(self)
 
     def extend(self, iterable) -> None:
-        super().extend(iterable)
-        self._propagate()
+        size = len(self)
+        list.extend(self, iterable)
+        context = self._context
+        if context is not None:
+            self._attach(list.__getitem__(self, slice(size, None)), context)
+            context._propagate(self)
 
     def clear(self) -> None:
-        super().clear()
-        self._propagate()
+        list.clear(self)
+        if self._context is not None:
+            self._context._propagate(self)
 
     def dump(self) -> list:
-        return [i.dump() if isinstance(i, _List) or isinstance(i, _Dict) else i for i in self.copy()]
+        return [i.dump() if isinstance(i, Propagate) else i for i in list.__iter__(self)]
 
 
 class _Dict(Propagate, dict):
@@ -126,37 +829,191 @@ class _Dict(Propagate, dict):
         dict.__init__(self, seq)
 
     def __getattr__(self, key):
-        if key.startswith('_'):
-            return super().__getattribute__(key)
-        else:
-            return super().__getitem__(key)
+        # 仅在常规属性查找失败时调用，私有属性(_father等)不会进入此处
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            if key[:1] == '_':
+                # copy/pickle等查询的特殊方法
+                raise AttributeError(key) from None
+            raise
 
     def __setattr__(self, key, value):
-        if key.startswith('_'):
-            super().__setattr__(key, value)
-        else:
-            super().__setitem__(key, value)
-        self._propagate()
+        if key[:1] == '_':
+            # 私有属性不属于配置，不上报
+            object.__setattr__(self, key, value)
+            return
+        self.__setitem__(key, value)
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, value)
-        self._propagate()
-
-    def pop(self, k):
-        r = super().pop(k)
-        self._propagate()
+        context = self._context
+        if context is None:
+            dict.__setitem__(self, key, value)
+            return
+        old = dict.get(self, key, _MISSING)
+        dict.__setitem__(self, key, value)
+        self._attach((value,), context)
+        if not _unchanged(old, value):
+            context._propagate(self, key)
+
+    def pop(self, k, *default):
+        r = dict.pop(self, k, *default)
+        if self._context is not None:
+            self._context._propagate(self, k)
         return r
 
-    def update(self, __m, **kwargs) -> None:
-        super().update(__m, **kwargs)
-        self._propagate()
+    def update(self, __m=(), **kwargs) -> None:
+        dict.update(self, __m, **kwargs)
+        context = self._context
+        if context is not None:
+            self._attach(dict.values(self), context)
+            context._propagate(self)
 
     def clear(self) -> None:
-        super().clear()
-        self._propagate()
+        dict.clear(self)
+        if self._context is not None:
+            self._context._propagate(self)
+
+    def dump(self) -> dict:
+        return {k: (v.dump() if isinstance(v, Propagate) else v) for k, v in dict.items(self)}
+
+
+class _LazyList(_List):
+    """
+    惰性list，子配置保持为原始dict/list，首次访问时才转为配置对象
+    """
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        v = list.__getitem__(self, item)
+        if type(v) is dict or type(v) is list:
+            v = lazy2obj(v, father=self)
+            list.__setitem__(self, item, v)
+        return v
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def dump(self) -> list:
+        return [_dump_value(i) for i in list.__iter__(self)]
+
+
+class _LazyDict(_Dict):
+    """
+    惰性dict，子配置保持为原始dict/list，首次访问时才转为配置对象
+    values/items会转换全部子配置
+    """
+
+    def __getitem__(self, key):
+        v = dict.__getitem__(self, key)
+        if type(v) is dict or type(v) is list:
+            v = lazy2obj(v, father=self)
+            dict.__setitem__(self, key, v)
+        return v
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            if key[:1] == '_':
+                raise AttributeError(key) from None
+            raise
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self) -> list:
+        return [self[k] for k in dict.__iter__(self)]
+
+    def items(self) -> list:
+        return [(k, self[k]) for k in dict.__iter__(self)]
+
+    def dump(self) -> dict:
+        return {k: _dump_value(v) for k, v in dict.items(self)}
+
+
+class Frozen:
+    """
+    配置的只读视图(快照)，键直接存于实例__dict__，属性读取为一次常规属性查找
+    list转为tuple，修改时抛出TypeError，原配置修改后需重新调用freeze
+    与方法同名的键(keys/items/get/dump)读取时优先为键值，此时可用 v['key'] / _dump_value(v)
+    """
+
+    def __setattr__(self, key, value):
+        raise TypeError('frozen config')
+
+    def __delattr__(self, key):
+        raise TypeError('frozen config')
+
+    def __getitem__(self, key):
+        return self.__dict__[key]
+
+    def __contains__(self, key):
+        return key in self.__dict__
+
+    def __iter__(self):
+        return iter(self.__dict__)
+
+    def __len__(self):
+        return len(self.__dict__)
+
+    def __eq__(self, other):
+        if isinstance(other, Frozen):
+            return self.__dict__ == other.__dict__
+        if isinstance(other, dict):
+            return _dump_value(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(_dump_value(self))
+
+    def get(self, key, default=None):
+        return self.__dict__.get(key, default)
+
+    def keys(self):
+        return self.__dict__.keys()
+
+    def items(self):
+        return self.__dict__.items()
 
     def dump(self) -> dict:
-        return {k: (v.dump() if isinstance(v, _List) or isinstance(v, _Dict) else v) for k, v in self.copy().items()}
+        return _dump_value(self)
+
+
+def freeze(config) -> Any:
+    """
+    生成配置的只读视图，dict转为Frozen，list转为tuple
+    :param config: 配置(_Dict/_List/dict/list/Record/LazyConfig)
+    """
+    config = _unwrap(config)
+    if isinstance(config, (dict, Record)):
+        view = object.__new__(Frozen)
+        object.__getattribute__(view, '__dict__').update((k, freeze(v)) for k, v in config.items())
+        return view
+    elif isinstance(config, (list, tuple)):
+        return tuple(freeze(i) for i in config)
+    else:
+        return config
+
+
+def _dump_value(value):
+    """
+    同dump，原始dict/list也会被复制
+    """
+    if isinstance(value, (Propagate, Record)):
+        return value.dump()
+    elif isinstance(value, Frozen):
+        return {k: _dump_value(v) for k, v in value.__dict__.items()}
+    elif isinstance(value, tuple):
+        return [_dump_value(i) for i in value]
+    elif isinstance(value, dict):
+        return {k: _dump_value(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_dump_value(i) for i in value]
+    else:
+        return value
 
 
 class CustomType:
@@ -172,6 +1029,87 @@ class CustomType:
     def parse(self, data: Any = None, father: Propagate = None) -> Any: ...  # 解析配置并返回格式化后字典
 
 
+class ArgvIndex:
+    """
+    命令行参数索引，遍历一次参数列表，按键查询为O(1)
+    支持 -key value / -key=value，同一键可重复出现，-- 之后的参数不作为键
+    """
+
+    def __init__(self, argv: list):
+        self.argv = argv
+        self.signature = self._signature(argv)
+        # 键 -> [(位置, =后的值或None), ...]
+        index = {}
+        for i in range(1, len(argv)):
+            arg = argv[i]
+            if arg == '--':
+                break
+            if arg.startswith('-') and '=' in arg:
+                key, value = arg.split('=', 1)
+            else:
+                key, value = arg, None
+            index.setdefault(key, []).append((i, value))
+        self._index = index
+
+    @staticmethod
+    def _signature(argv: list) -> tuple:
+        """
+        参数列表未变化的判断依据: 对象/长度/最后一项，原地修改中间项时需调用Cmd.refresh
+        """
+        return id(argv), len(argv), argv[-1] if argv else None
+
+    def valid(self, argv: list) -> bool:
+        return self.argv is argv and self.signature == self._signature(argv)
+
+    def _value(self, position: int, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            return value
+        position += 1
+        if position < len(self.argv) and self.argv[position] != '--':
+            return self.argv[position]
+        return None
+
+    def find(self, *keys) -> Optional[tuple]:
+        """
+        :param keys: 按顺序查询的键，忽略空键
+        :return: 首个存在的键第一次出现的 (位置, =后的值或None)，均不存在时为None
+        """
+        for key in keys:
+            if key:
+                occurrences = self._index.get(key)
+                if occurrences:
+                    return occurrences[0]
+        return None
+
+    def get(self, *keys) -> Any:
+        """
+        :return: 首个存在的键的值(=后的值或下一个参数)，键存在但无值时为None，均不存在时为...
+        """
+        found = self.find(*keys)
+        return ... if found is None else self._value(*found)
+
+    def get_all(self, *keys) -> list:
+        """
+        :return: 各键所有出现位置的值，按出现顺序，无值的项省略
+        """
+        occurrences = sorted(o for key in keys if key for o in self._index.get(key, ()))
+        return [v for v in (self._value(*o) for o in occurrences) if v is not None]
+
+
+_argv_index: Optional[ArgvIndex] = None
+
+
+def argv_index() -> ArgvIndex:
+    """
+    sys.argv 的索引，sys.argv 变化时重建
+    """
+    global _argv_index
+    index = _argv_index
+    if index is None or not index.valid(sys.argv):
+        index = _argv_index = ArgvIndex(sys.argv)
+    return index
+
+
 class Cmd(CustomType):
     need_data = False
     _dict = {
@@ -188,6 +1126,7 @@ class Cmd(CustomType):
         :param prefix: 前缀 e.g. - / --
         :param expect: 期望类 str/int/float/bool 如为bool键存在即为true
                         特殊的，可以使用str类型的"str"/"int"/"float" 表示接受无参
+                        为list时返回键(及缩写)重复出现的所有值
         """
         self.key = prefix + key
         self.short = short and prefix + (key[0] if short is True else short)
@@ -199,24 +1138,35 @@ class Cmd(CustomType):
         else:
             return self.get_value()
 
+    @staticmethod
+    def refresh() -> None:
+        """
+        重建命令行参数索引，原地修改 sys.argv 中间的项后调用
+        """
+        global _argv_index
+        _argv_index = None
+
     def get_value(self):
         """
         从命令行获取值
         :return: value/False
         """
-        index = self.key in sys.argv and sys.argv.index(self.key) \
-                or self.short and self.short in sys.argv and sys.argv.index(self.short)
-        if index:
-            index += 1
+        index = argv_index()
+        if self.expect == list:
+            return index.get_all(self.key, self.short) or self.null
+        found = index.find(self.key, self.short)
+        if found is not None:
             if self.expect == bool:
-                return True
-            elif self.expect in self._dict:
-                if index < len(sys.argv):
-                    return self._dict[self.expect](sys.argv[index])
+                # -key=false 等显式的值
+                return found[1] is None or found[1].lower() not in ('0', 'false', 'no', 'off')
+            value = index.get(self.key, self.short)
+            if self.expect in self._dict:
+                if value is not None:
+                    return self._dict[self.expect](value)
                 else:
                     return True
-            elif index < len(sys.argv):
-                return sys.argv[index]
+            elif value is not None:
+                return value
             else:
                 raise ValueError('%s must have param (type %s)' % (self.key, self.expect))
         else:
@@ -290,11 +1240,13 @@ def buildin2expect(value, _type, father=None):
             # e.g. 3600 * 8
             return eval(value)
         else:
-            int(value)
+            return int(value)
     elif _type == bool:
         return bool(value)
     elif _type == list or _type == dict:
         return config2obj(value, father=father)
+    elif _type == noneType:
+        return value
     else:
         raise TypeError
 
@@ -438,17 +1390,36 @@ def config2obj(config, father=None):
     """
     if isinstance(config, list):
         l = _List(father=father)
-        l.extend(config2obj(c, father=l) for c in config)
+        # 新建的子树，直接填充无需上报
+        list.extend(l, [config2obj(c, l) for c in config])
         return l
     elif isinstance(config, dict):
         d = _Dict(father=father)
-        for k, v in config.items():
-            d[k] = config2obj(v, father=d)
+        dict.update(d, {k: config2obj(v, d) for k, v in config.items()})
         return d
     else:
         return config
 
 
+def lazy2obj(config, father=None):
+    """
+    同config2obj，但只转换最外层，子配置在首次访问时才转换
+    :param config: 可为str/int/list/dict
+    :param father: 父配置，用于同步文件
+    :return: 对象
+    """
+    if isinstance(config, list):
+        return _LazyList(config, father=father)
+    elif isinstance(config, dict):
+        return _LazyDict(config, father=father)
+    else:
+        return config
+
+
+def _raw(config, father=None):
+    return config
+
+
 def config2expect(config: Any, expect: Any, father=None):
     """
     将配置转为预期类，并根据期望对象提供默认值/类型检查
@@ -473,8 +1444,707 @@ def config2expect(config: Any, expect: Any, father=None):
         return dict2expect(config, expect, father=father)
 
 
-def read_config(path: Union[str, bool] = 'config', raw_path: str = None, data: Any = None, expect: type = None,
-                sync: bool = False):
+# 期望对象 -> 转换函数，见compile_expect
+_schema_cache: dict = {}
+# buildin2expect中int的表达式格式 e.g. 3600 * 8
+_int_expression = re.compile('^[0-9 *]+$')
+
+
+def compile_expect(expect: Any, lazy: bool = False, slots: bool = False):
+    """
+    将期望对象编译为可复用的转换函数(校验计划)，结果按期望对象缓存
+    类标注/默认值/Union分支顺序只在编译时解析一次，转换结果与config2expect一致
+    期望类在编译后被修改需调用 _schema_cache.clear() (slots模式还需 _record_classes.clear())
+    :param expect: 期望对象
+    :param lazy: 未标注的键/dict/list类型的值在首次访问时才转换，见lazy2obj
+    :param slots: 期望类转为__slots__记录(见record_class)，其余dict/list保持为一般dict/list，不支持同步，lazy无效
+    :return: 转换函数 convert(config, father=None) -> 配置对象
+    """
+    lazy = lazy and not slots
+    try:
+        return _schema_cache[expect, lazy, slots]
+    except KeyError:
+        pass
+    except TypeError:
+        # 不可哈希的期望对象，不缓存
+        return _compile(expect, lazy, slots)
+    convert = _schema_cache[expect, lazy, slots] = _compile(expect, lazy, slots)
+    return convert
+
+
+def _compile(expect: Any, lazy: bool, slots: bool):
+    if isinstance(expect, CustomType):
+        return _compile_custom(expect)
+    if isbuildin(expect):
+        return _compile_buildin(expect, lazy, slots)
+    if istyping(expect):
+        return _compile_typing(expect, lazy, slots)
+    elif slots:
+        return _compile_record(expect)
+    else:
+        return _compile_class(expect, lazy)
+
+
+def _compile_custom(expect: CustomType):
+    need_data, null, parse = expect.need_data, expect.null, expect.parse
+
+    def convert(config, father=None):
+        v = not need_data and parse(father=father) or parse(config, father=father)
+        if v == null:
+            raise ConfigError(expect, '', 'missing config')
+        return v
+
+    return convert
+
+
+def _compile_buildin(_type: type, lazy: bool, slots: bool):
+    if _type == str:
+        def convert(value, father=None):
+            return str(value)
+    elif _type == int:
+        def convert(value, father=None):
+            if isinstance(value, (int, float)):
+                return value
+            elif isinstance(value, str) and _int_expression.search(value):
+                return eval(value)
+            else:
+                return int(value)
+    elif _type == bool:
+        def convert(value, father=None):
+            return bool(value)
+    elif _type == list or _type == dict:
+        convert = _raw if slots else lazy2obj if lazy else config2obj
+    else:
+        def convert(value, father=None):
+            return buildin2expect(value, _type, father=father)
+    return convert
+
+
+def _compile_typing(_type: _GenericAlias, lazy: bool, slots: bool):
+    origin, args = _type.__origin__, _type.__args__
+    if origin == list and slots:
+        item = compile_expect(args[0], slots=True)
+
+        def convert(value, father=None):
+            return [item(i) for i in value]
+    elif origin == list:
+        item = compile_expect(args[0], lazy)
+
+        def convert(value, father=None):
+            l = _List(father=father)
+            list.extend(l, [item(i, l) for i in value])
+            return l
+    elif origin == dict and slots:
+        key, item = compile_expect(args[0]), compile_expect(args[1], slots=True)
+
+        def convert(value, father=None):
+            return {key(k): item(v) for k, v in value.items()}
+    elif origin == dict:
+        key, item = compile_expect(args[0]), compile_expect(args[1], lazy)
+
+        def convert(value, father=None):
+            d = _Dict(father=father)
+            for k, v in value.items():
+                dict.__setitem__(d, key(k), item(v, d))
+            return d
+    elif origin == Union:
+        # 分支按声明顺序检查，类预期无法检测，取最后一个作为默认
+        branches, default = [], None
+        for t in args:
+            if istyping(t):
+                branches.append((t.__origin__, compile_expect(t, lazy, slots)))
+            elif isinstance(t, CustomType):
+                branches.append((t, None))
+            elif not isbuildin(t):
+                default = compile_expect(t, lazy, slots)
+            else:
+                branches.append((t, compile_expect(t, lazy, slots)))
+
+        def convert(value, father=None):
+            for t, conv in branches:
+                if conv is None:
+                    r = t.parse(value, father=father)
+                    if r != t.null:
+                        return r
+                elif isinstance(value, t):
+                    return conv(value, father)
+            if default is not None:
+                return default(value, father)
+            raise TypeError('no matched type in %s' % _type)
+    else:
+        convert = _raw if slots else lazy2obj if lazy else config2obj
+    return convert
+
+
+def _compile_class(expect: type, lazy: bool):
+    fields, extra = [], []
+    # lazy时未标注的键保持原始数据，由_LazyDict在访问时转换
+    node, obj = (_LazyDict, _raw) if lazy else (_Dict, config2obj)
+
+    def convert(value, father=None):
+        d = node(father=father)
+        k = None
+        try:
+            for k, field in fields:
+                dict.__setitem__(d, k, field(value, d))
+        except (ValueError, TypeError) as err:
+            raise ConfigError(expect, k, err.args[0] if err.args else '')
+        except ConfigError as err:
+            raise ConfigError(expect, err.k, err.reason, err.expect)
+
+        for k, v in extra:
+            # 无标注默认值
+            dict.__setitem__(d, k, get_value(v, father=d))
+        for k, v in value.items():
+            if k not in d:
+                dict.__setitem__(d, k, obj(v, father=d))
+        return d
+
+    # 先登记再编译字段，以支持自引用的期望类
+    _schema_cache[expect, lazy, False] = convert
+    default = get_default(expect)
+    annotations = expect.__dict__.get('__annotations__', {})
+    fields.extend((k, _compile_field(expect, k, _type, default, lazy)) for k, _type in annotations.items())
+    extra.extend((k, v) for k, v in default.items() if k not in annotations)
+    return convert
+
+
+class Record:
+    """
+    slots模式的配置记录基类，期望类的字段存于__slots__，读取即为一次slot访问
+    不能作为slot的键(非标识符/与方法重名)及配置中未声明的键存于_extra
+    e.g. r.host / r['host'] / r.dump()
+    """
+    __slots__ = ('_extra',)
+    _fields: tuple = ()
+    # 生成该类的期望类
+    _expect: type = None
+
+    def __getattr__(self, key):
+        # 仅在slot中不存在时调用
+        extra = object.__getattribute__(self, '_extra')
+        if extra is not None and key in extra:
+            return extra[key]
+        raise AttributeError(key)
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        extra = self._extra
+        if extra is not None and key in extra:
+            return extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._fields or self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.dump() == (other.dump() if isinstance(other, Record) else other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.dump())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self) -> list:
+        return list(self._fields) + (list(self._extra) if self._extra else [])
+
+    def items(self) -> list:
+        return [(k, self[k]) for k in self.keys()]
+
+    def dump(self) -> dict:
+        return {k: _dump_value(v) for k, v in self.items()}
+
+    def __reduce__(self):
+        # 生成的类与期望类同名，pickle无法按名称找到，改为按期望类重建
+        values = {}
+        for k in self._fields:
+            try:
+                values[k] = object.__getattribute__(self, k)
+            except AttributeError:
+                pass
+        return _rebuild_record, (self._expect, values, self._extra)
+
+
+# 期望类 -> Record子类
+_record_classes = {}
+
+
+def record_class(expect: type) -> type:
+    """
+    为期望类生成Record子类，字段为期望类的标注及默认值的键，同一期望类返回同一个类
+    """
+    cls = _record_classes.get(expect)
+    if cls is not None:
+        return cls
+    default = get_default(expect)
+    keys = list(expect.__dict__.get('__annotations__', {})) + list(default)
+    fields = tuple(dict.fromkeys(k for k in keys if k.isidentifier() and not hasattr(Record, k)))
+    cls = _record_classes[expect] = type(expect.__name__, (Record,), {
+        '__slots__': fields, '_fields': fields, '_expect': expect,
+        '__module__': expect.__module__, '__qualname__': expect.__qualname__})
+    return cls
+
+
+def _rebuild_record(expect: type, values: dict, extra: Optional[dict]) -> Record:
+    """
+    pickle时重建Record，不重新校验(值已是转换后的结果)
+    """
+    r = object.__new__(record_class(expect))
+    for k, v in values.items():
+        setattr(r, k, v)
+    r._extra = extra
+    return r
+
+
+def _plain_value(value, father=None):
+    """
+    同get_value，但dict/list保持为一般dict/list(复制)
+    """
+    if isinstance(value, type):
+        return _dump_value(get_default(value))
+    elif callable(value):
+        return _dump_value(value())
+    else:
+        return _dump_value(value)
+
+
+def _compile_record(expect: type):
+    fields, extra = [], []
+    cls = record_class(expect)
+    slot_fields = set(cls._fields)
+
+    def convert(value, father=None):
+        r = object.__new__(cls)
+        others = {}
+        k = None
+        try:
+            for k, setter, field in fields:
+                v = field(value, None)
+                if setter is None:
+                    others[k] = v
+                else:
+                    setter(r, v)
+        except (ValueError, TypeError) as err:
+            raise ConfigError(expect, k, err.args[0] if err.args else '')
+        except ConfigError as err:
+            raise ConfigError(expect, err.k, err.reason, err.expect)
+
+        for k, setter, v in extra:
+            # 无标注默认值
+            if setter is None:
+                others[k] = _plain_value(v)
+            else:
+                setter(r, _plain_value(v))
+        for k, v in value.items():
+            if k not in slot_fields and k not in others:
+                others[k] = v
+        r._extra = others or None
+        return r
+
+    def setter(k):
+        return cls.__dict__[k].__set__ if k in slot_fields else None
+
+    # 先登记再编译字段，以支持自引用的期望类
+    _schema_cache[expect, False, True] = convert
+    default = get_default(expect)
+    annotations = expect.__dict__.get('__annotations__', {})
+    fields.extend((k, setter(k), _compile_field(expect, k, _type, default, False, True))
+                  for k, _type in annotations.items())
+    extra.extend((k, setter(k), v) for k, v in default.items() if k not in annotations)
+    return convert
+
+
+def _compile_field(expect: type, k: str, _type: Any, default: dict, lazy: bool, slots: bool = False):
+    """
+    编译类标注的单个字段，缺省时的处理顺序同dict2expect
+    """
+    has_default, default_value = k in default, default.get(k)
+    default_of = _plain_value if slots else get_value
+
+    if isinstance(_type, CustomType):
+        need_data, null, parse = _type.need_data, _type.null, _type.parse
+
+        def field(value, father):
+            v = not need_data and parse(father=father) \
+                or k in value and parse(value[k], father=father) \
+                or has_default and parse(default_value, father=father)
+            if v == null:
+                raise ConfigError(expect, k, 'missing config')
+            return v
+
+        return field
+
+    conv = compile_expect(_type, lazy, slots)
+    if has_default:
+        def missing(father):
+            return default_of(default_value, father=father)
+    elif istyping(_type) and _type.__origin__ == Union:
+        def missing(father):
+            return union2expect(_type.__args__, father=father, k=k)
+    elif not isbuildin(_type) and not istyping(_type):
+        def missing(father):
+            return conv({}, father)
+    else:
+        def missing(father):
+            raise ConfigError(expect, k, 'missing config')
+
+    def field(value, father):
+        if k in value:
+            return conv(value[k], father)
+        return missing(father)
+
+    return field
+
+
+def load_file(path: str) -> Any:
+    """
+    读取配置文件(.yaml/.json)，json配置会应用增量同步日志
+    :param path: 文件路径
+    :return: 一般dict/list，空文件为{}
+    """
+    with open(path, mode='rt', encoding='utf-8') as f:
+        if path.endswith('.yaml'):
+            loader = _yaml_loader()
+            config = yaml.load(f, Loader=loader)
+        elif path.endswith('.json'):
+            config = json.load(f)
+        else:
+            raise TypeError(f'not support config file type {path}')
+
+    if path.endswith('.json') and os.path.exists(journal_path(path)):
+        config = apply_patch(config, read_journal(path))
+    if config is None:
+        config = {}
+    return config
+
+
+def cache_path(path: str) -> str:
+    """
+    配置快照缓存路径，位于配置文件同目录的__pycache__下
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, '__pycache__', name + '.cache')
+
+
+def _cache_key(path: str, expect: Any) -> Optional[tuple]:
+    """
+    快照缓存键: 文件路径/大小/修改时间，日志的大小/修改时间，期望对象的指纹
+    期望对象含CustomType时加入命令行参数，含函数默认值时不缓存
+    :return: 缓存键，不可缓存时为None
+    """
+    fingerprint, flags = schema_fingerprint(expect) if expect else ('', ())
+    if 'callable' in flags:
+        return None
+    stat = os.stat(path)
+    try:
+        journal = os.stat(journal_path(path))
+        journal = journal.st_size, journal.st_mtime_ns
+    except FileNotFoundError:
+        journal = None
+    argv = tuple(sys.argv) if 'custom' in flags else ()
+    return _CACHE_VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, journal, fingerprint, argv
+
+
+_CACHE_VERSION = 1
+
+
+def _read_cache(path: str, key: tuple) -> Any:
+    """
+    :return: 缓存的配置(一般dict/list)，未命中时为...
+    """
+    try:
+        with open(cache_path(path), mode='rb') as f:
+            cached_key, data = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return ...
+    return data if cached_key == key else ...
+
+
+def _write_cache(path: str, key: tuple, data) -> None:
+    """
+    原子写入快照缓存，数据不可marshal或目录不可写时放弃
+    """
+    try:
+        raw = marshal.dumps((key, data))
+        directory = os.path.dirname(cache_path(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    except (ValueError, OSError):
+        return
+    try:
+        with os.fdopen(fd, mode='wb') as f:
+            f.write(raw)
+        os.replace(tmp, cache_path(path))
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# 期望对象 -> (指纹, 标记)，见schema_fingerprint
+_fingerprint_cache: dict = {}
+
+
+def schema_fingerprint(expect: Any) -> tuple:
+    """
+    期望对象的指纹，在不同进程间稳定，期望类的标注/默认值变化时随之变化
+    :param expect: 期望对象
+    :return: (指纹, 标记) 标记包含 custom: 含CustomType / callable: 含函数默认值
+    """
+    try:
+        return _fingerprint_cache[expect]
+    except (KeyError, TypeError):
+        pass
+    flags = set()
+    r = _fingerprint(expect, set(), flags), frozenset(flags)
+    try:
+        _fingerprint_cache[expect] = r
+    except TypeError:
+        pass
+    return r
+
+
+def _fingerprint(expect: Any, seen: set, flags: set) -> str:
+    if isinstance(expect, CustomType):
+        flags.add('custom')
+        return '%s(%s)' % (type(expect).__qualname__, ','.join(
+            '%s=%s' % (k, _fingerprint(v, seen, flags)) for k, v in sorted(vars(expect).items())))
+    elif istyping(expect):
+        return '%s[%s]' % (expect.__origin__, ','.join(_fingerprint(t, seen, flags) for t in expect.__args__))
+    elif isinstance(expect, type):
+        name = '%s.%s' % (expect.__module__, expect.__qualname__)
+        if isbuildin(expect) or expect in seen:
+            return name
+        seen.add(expect)
+        annotations = expect.__dict__.get('__annotations__', {})
+        default = get_default(expect)
+        return '%s{%s|%s}' % (
+            name,
+            ','.join('%s:%s' % (k, _fingerprint(t, seen, flags)) for k, t in annotations.items()),
+            ','.join('%s=%s' % (k, _fingerprint(v, seen, flags)) for k, v in default.items()))
+    elif callable(expect):
+        flags.add('callable')
+        return getattr(expect, '__qualname__', type(expect).__qualname__)
+    else:
+        return repr(expect)
+
+
+def resolve_path(path: str) -> str:
+    """
+    补全配置文件后缀名，按 原路径 > .yaml > .json 顺序查找
+    """
+    if not os.path.exists(path):
+        for i in ['.yaml', '.json']:
+            if os.path.exists(path + i):
+                return path + i
+        raise FileNotFoundError(path)
+    return path
+
+
+class _Interior:
+    """
+    分层合并时表示dict节点的标记
+    """
+
+    def __repr__(self):
+        return '<interior>'
+
+
+_INTERIOR = _Interior()
+
+
+def _flatten(data, path: tuple, nodes: dict, keys: dict) -> None:
+    """
+    将一层配置展开为 路径 -> 值 的查询表(先序，dict节点为_INTERIOR)
+    keys记录各dict节点 小写键 -> 原键，用于环境变量的键名匹配
+    """
+    if isinstance(data, dict):
+        nodes[path] = _INTERIOR
+        table = keys.setdefault(path, {})
+        for k, v in data.items():
+            table.setdefault(str(k).lower(), k)
+            _flatten(v, path + (k,), nodes, keys)
+    else:
+        nodes[path] = data
+
+
+# JSON标量: 数字/true/false/null
+_RE_JSON_SCALAR = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+
+
+def _expect_type(expect: Any, path: tuple) -> Any:
+    """
+    期望类中路径对应的类提示(键忽略大小写，Optional取其类型)，无法确定时为None
+    """
+    _type = expect
+    for k in path:
+        if not isinstance(_type, type) or isbuildin(_type):
+            return None
+        annotations = {name.lower(): t for name, t in _type.__dict__.get('__annotations__', {}).items()}
+        _type = annotations.get(str(k).lower())
+        if istyping(_type) and _type.__origin__ == Union:
+            args = [t for t in _type.__args__ if t is not noneType]
+            _type = args[0] if len(args) == 1 else _type
+    return _type
+
+
+def _parse_text(value: str, _type: Any = None) -> Any:
+    """
+    解析环境变量/命令行中的值，不使用yaml(yaml 1.1会将 no -> False、0755 -> 493)
+    期望类型为str时保持原值，为list/dict时按JSON解析，其余只解析JSON标量 e.g. '8080' -> 8080 / 'true' -> True
+    解析失败时保持原值
+    :param _type: 期望类中该路径的类提示，见_expect_type
+    """
+    if _type is str or not value:
+        return value
+    if _type in (list, dict) or istyping(_type) and _type.__origin__ in (list, dict):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    if _RE_JSON_SCALAR.fullmatch(value):
+        return json.loads(value)
+    return value
+
+
+def _text_layer(items, keys: dict, expect: Any = None) -> dict:
+    """
+    由 (路径, 文本值) 构造一层配置，路径中的键按keys忽略大小写匹配已有的键，不存在时为小写
+    值的解析见_parse_text，有expect时按路径对应的类提示解析
+    """
+    data = {}
+    for path, value in items:
+        node, prefix = data, ()
+        for i, k in enumerate(path):
+            k = keys.get(prefix, {}).get(k.lower(), k.lower())
+            prefix += (k,)
+            if i == len(path) - 1:
+                node[k] = _parse_text(value, _expect_type(expect, prefix) if expect else None)
+            else:
+                child = node.get(k)
+                if not isinstance(child, dict):
+                    child = node[k] = {}
+                node = child
+    return data
+
+
+def env_layer(prefix: str, keys: dict = None, environ=None, expect: Any = None) -> dict:
+    """
+    环境变量层，变量名去掉前缀后按 __ 分割为路径 e.g. APP_DATABASE__PORT=3306 -> {'database': {'port': 3306}}
+    :param prefix: 变量名前缀 e.g. APP_
+    :param keys: 已有配置的键名表，见_flatten
+    :param environ: 环境变量，默认为os.environ
+    :param expect: 期望类，用于确定值的解析方式，见_parse_text
+    """
+    environ = os.environ if environ is None else environ
+    return _text_layer(((name[len(prefix):].split('__'), value) for name, value in environ.items()
+                        if name.startswith(prefix) and len(name) > len(prefix)), keys or {}, expect)
+
+
+def argv_layer(key: str, keys: dict = None, expect: Any = None) -> dict:
+    """
+    命令行参数层，键可重复 e.g. --set database.port=3306 --set debug=true
+    :param key: 参数键 e.g. --set
+    :param keys: 已有配置的键名表，见_flatten
+    :param expect: 期望类，用于确定值的解析方式，见_parse_text
+    """
+    items = []
+    for arg in argv_index().get_all(key):
+        path, sep, value = arg.partition('=')
+        if sep:
+            items.append((path.split('.'), value))
+    return _text_layer(items, keys or {}, expect)
+
+
+def merge_layers(layers: list, env_prefix: str = None, argv: str = None, expect: Any = None) -> tuple:
+    """
+    按优先级合并多层配置，各层展开为 路径 -> 值 的查询表后由高到低确定每个路径的来源，不做逐层深度合并
+    dict按键合并，其余值(含list)整体覆盖，高优先级的非dict值会覆盖低优先级同路径下的整棵子树
+    :param layers: [(层名, 配置)]，优先级由低到高
+    :param env_prefix: 追加环境变量层(层名env)，见env_layer
+    :param argv: 追加命令行参数层(层名argv)，见argv_layer
+    :param expect: 期望类，环境变量/命令行参数中的值按其类提示解析
+    :return: (合并后的配置, 路径 -> 来源层名)
+    """
+    tables, keys = [], {}
+    layers = list(layers)
+    for name, data in layers:
+        nodes = {}
+        _flatten(data, (), nodes, keys)
+        tables.append((name, nodes))
+    # 环境变量/命令行参数层的键名依赖前面各层的键名表
+    for name, layer in (('env', env_prefix and env_layer), ('argv', argv and argv_layer)):
+        if layer:
+            nodes = {}
+            _flatten(layer(env_prefix if name == 'env' else argv, keys, expect=expect), (), nodes, keys)
+            tables.append((name, nodes))
+
+    # 由高到低确定每个路径的来源: 叶子路径 -> 层序号，以及保留的dict路径
+    chosen, interiors = {}, set()
+    for i in range(len(tables) - 1, -1, -1):
+        for path, value in tables[i][1].items():
+            if path in chosen or path in interiors:
+                continue
+            if any(path[:j] in chosen for j in range(len(path))):
+                continue
+            if value is _INTERIOR:
+                interiors.add(path)
+            else:
+                chosen[path] = i
+
+    if () in chosen:
+        name, nodes = tables[chosen[()]]
+        return nodes[()], {(): name}
+
+    # 由低到高构造，键的顺序为首次出现的顺序
+    root, origins = {}, {}
+    containers = {(): root}
+    for _, nodes in tables:
+        for path in nodes:
+            if path in containers or path in origins:
+                continue
+            if path in interiors:
+                containers[path] = containers[path[:-1]][path[-1]] = {}
+            elif path in chosen:
+                name, source = tables[chosen[path]]
+                containers[path[:-1]][path[-1]] = source[path]
+                origins[path] = name
+    return root, origins
+
+
+def config_origin(config, path: Union[str, tuple]) -> Optional[str]:
+    """
+    查询分层配置中某个值的来源层
+    :param config: read_config产物
+    :param path: 路径 e.g. 'database.port' / ('database', 'port')
+    :return: 层名(文件路径/env/argv)，dict节点或非分层配置为None
+    """
+    config = _unwrap(config)
+    origins = getattr(config, '_origins', None) if isinstance(config, Propagate) else None
+    if not origins:
+        return None
+    if isinstance(path, str):
+        path = tuple(path.split('.')) if path else ()
+    for j in range(len(path), -1, -1):
+        origin = origins.get(path[:j])
+        if origin is not None:
+            return origin
+    return None
+
+
+def read_config(path: Union[str, bool] = 'config', raw_path: str = None, data: Any = None, expect: type = None,
+                sync: bool = False, sync_interval: float = 0, sync_background: bool = True,
+                sync_journal: bool = False, lazy: bool = False, cache: bool = False,
+                overlays: list = None, env_prefix: str = None, argv: str = None, slots: bool = False):
     """
     读取配置文件，默认在config文件夹下寻找，可用raw_path通过绝对路径读取
     可省略后缀名，会尝试自动读取，目前支持 .yaml/.json
@@ -483,74 +2153,438 @@ def read_config(path: Union[str, bool] = 'config', raw_path: str = None, data: A
     :param data: 配置数据，存在时path/raw_path无效
     :param expect: 期望类
     :param sync: 是否同步到文件
+    :param sync_interval: 同步间隔(秒)，间隔内的修改合并为一次写入，0为每次修改立即写入
+    :param sync_background: 是否在后台线程写入，写入均为原子替换
+    :param sync_journal: 是否将修改增量写入日志(JSON Patch)，仅支持.json，读取时会自动应用日志
+    :param lazy: 子配置在首次访问时才转换，有expect时只作用于未标注的键及dict/list类型的值
+    :param cache: 是否使用快照缓存，文件与期望类未变化时跳过解析与校验，见cache_path
+    :param overlays: 覆盖配置文件，与path相同在config文件夹下寻找，按顺序优先级递增
+    :param env_prefix: 读取以此为前缀的环境变量，优先级高于文件，见env_layer
+    :param argv: 读取此命令行参数(如--set)中的 路径=值，优先级最高，见argv_layer
+    分层时用config_origin查询值的来源，不支持sync与cache
+    :param slots: 期望类转为__slots__记录，内存占用更小，读取更快，需要expect，不支持sync/lazy，见Record
     """
+    layered = overlays or env_prefix or argv
+    if layered and sync:
+        raise ValueError('sync not support layered config')
+    if slots and (sync or not expect):
+        raise ValueError('slots need expect and not support sync')
+
+    key, cached = None, ...
     if not data is None:
         config = data
     elif path:
-        path = raw_path or os.path.join('config', path)
-        if not os.path.exists(path):
-            for i in ['.yaml', '.json']:
-                if os.path.exists(path + i):
-                    path = path + i
-                    break
-            else:
-                raise FileNotFoundError(path)
-
-        with open(path, mode='rt', encoding='utf-8') as f:
-            if path.endswith('.yaml'):
-                if not yaml:
-                    raise yaml_import_error
-                config = yaml.safe_load(f)
-            elif path.endswith('.json'):
-                config = json.load(f)
-            else:
-                raise TypeError(f'not support config file type {path}')
+        path = resolve_path(raw_path or os.path.join('config', path))
 
-        if config is None:
-            config = {}
+        if cache and not layered and not slots:
+            key = _cache_key(path, expect)
+            if key is not None:
+                cached = _read_cache(path, key)
+        config = load_file(path) if cached is ... else cached
     else:
         config = {}
 
-    if expect:
+    origins = None
+    if layered:
+        layers = [(path if isinstance(path, str) else 'data', config)]
+        layers += [(p, load_file(p)) for p in (resolve_path(os.path.join('config', o)) for o in overlays or ())]
+        config, origins = merge_layers(layers, env_prefix=env_prefix, argv=argv, expect=expect)
+
+    if cached is not ...:
+        # 缓存的是校验后的配置
+        config = (lazy2obj if lazy else config2obj)(config)
+    elif expect:
         try:
-            config = config2expect(config, expect)
+            config = compile_expect(expect, lazy, slots)(config)
         except ConfigError as err:
             raise ConfigError('%s config error %s: %s' % (err.expect, err.k, err.reason))
     else:
-        config = config2obj(config)
+        config = (lazy2obj if lazy else config2obj)(config)
+
+    if key is not None and cached is ...:
+        _write_cache(path, key, config.dump() if isinstance(config, Propagate) else config)
+
+    if origins is not None and isinstance(config, Propagate):
+        object.__setattr__(config, '_origins', origins)
 
     if sync:
-        _sync(config, path)
+        _sync(config, path, interval=sync_interval, background=sync_background, journal=sync_journal)
 
     return config
 
 
-def _sync(config, path: str) -> None:
+def _sync(config, path: str, interval: float = 0, background: bool = True, journal: bool = False) -> SyncContext:
     """
     将配置与文件绑定，即配置的修改会同步到文件
-    config._father = None  取消绑定
+    config._context.close()  取消绑定
     :param config: 配置，需为read_config产物
     :param path: 绝对/相对路径
+    :param interval: 同步间隔(秒)，详见SyncContext
+    :param background: 是否在后台线程写入
+    :param journal: 是否增量写入日志
+    :return: 同步上下文
     """
+    config = _unwrap(config)
+    context = SyncContext(config, path, interval, background, journal)
+    bind(config, context)
+    context._propagate()
+    return context
 
-    def write(config):
-        with open(path, mode='wt', encoding='utf-8') as f:
-            if path.endswith('.yaml'):
-                if not yaml:
-                    raise yaml_import_error
-                yaml.dump(config.dump(), f)
-            elif path.endswith('.json'):
-                json.dump(config.dump(), f, ensure_ascii=False, indent=2)
+
+def sync(config, path: str = 'config', raw_path: str = None, interval: float = 0,
+         background: bool = True, journal: bool = False) -> SyncContext:
+    path = raw_path or os.path.join('config', path)
+    return _sync(config, path, interval, background, journal)
+
+
+class _Inotify:
+    """
+    通过ctypes调用inotify监听目录，目录中有文件变化时唤醒
+    不可用(非Linux等)时构造抛出OSError
+    """
+    # IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+
+    def __init__(self, directory: str):
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as err:
+            raise OSError('inotify not available') from err
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed: %s' % directory)
+
+    def wait(self, wakeup: int, timeout: float) -> None:
+        """
+        阻塞直到有事件、wakeup可读或超时，并清空事件
+        """
+        readable, _, _ = select.select([self.fd, wakeup], [], [], timeout)
+        if self.fd in readable:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    """
+    文件变化的判断依据: 修改时间/大小/inode，json配置包含增量日志
+    :return: 文件不存在时为None
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = stat.st_mtime_ns, stat.st_size, stat.st_ino
+    if path.endswith('.json'):
+        try:
+            journal = os.stat(journal_path(path))
+            signature += (journal.st_mtime_ns, journal.st_size)
+        except FileNotFoundError:
+            pass
+    return signature
+
+
+def apply_diff(node: Propagate, new, path: tuple = (), changed: list = None) -> list:
+    """
+    将新配置与现有配置树逐层比较，只原地修改变化的键，不上报(不触发同步)
+    dict按键比较，等长list按项比较，长度不同的list原地替换全部项并记录list的路径，其余不同的值整体替换
+    :param node: 现有配置(_Dict/_List)
+    :param new: 新配置(dict/list)，需与node类型一致
+    :param path: node的路径
+    :param changed: 收集变化的路径
+    :return: 变化的路径
+    """
+    changed = [] if changed is None else changed
+    lazy = isinstance(node, (_LazyDict, _LazyList))
+
+    def convert(value):
+        # 惰性配置保持原始值，访问时转换
+        if lazy:
+            return value
+        value = config2obj(value, father=node)
+        if isinstance(value, Propagate) and node._context is not None:
+            bind(value, node._context)
+        return value
+
+    if isinstance(node, dict):
+        for k in [k for k in dict.__iter__(node) if k not in new]:
+            dict.__delitem__(node, k)
+            changed.append(path + (k,))
+        items = ((k, dict.get(node, k, _MISSING), v) for k, v in new.items())
+        setitem = dict.__setitem__
+    elif len(node) != len(new):
+        list.__setitem__(node, slice(None), [convert(v) for v in new])
+        changed.append(path)
+        return changed
+    else:
+        items = ((i, list.__getitem__(node, i), v) for i, v in enumerate(new))
+        setitem = list.__setitem__
+    for k, old, v in items:
+        if old is not _MISSING:
+            if isinstance(old, Propagate) and (isinstance(old, dict) and type(v) is dict
+                                               or isinstance(old, list) and type(v) is list and len(old) == len(v)):
+                apply_diff(old, v, path + (k,), changed)
+                continue
+            if type(old) is type(v) and old == v:
+                continue
+        setitem(node, k, convert(v))
+        changed.append(path + (k,))
+    return changed
+
+
+class Watcher:
+    """
+    监听配置文件，变化时在后台线程重新读取并校验，只将变化的键原地应用到现有配置树，并通知订阅者
+    优先使用inotify，不可用时每interval秒检查一次文件状态
+    """
+
+    def __init__(self, config: Propagate, path: str, expect: Any = None, interval: float = 1.0,
+                 loop=None, on_error=None, settle: float = 0.05):
+        """
+        :param config: read_config产物(_Dict/_List)
+        :param path: 配置文件路径
+        :param expect: 期望类，重新读取的配置校验不通过时不应用
+        :param interval: 轮询间隔(秒)，inotify可用时为检查停止的间隔
+        :param loop: asyncio事件循环，存在时通过loop.call_soon_threadsafe在事件循环中应用修改及通知
+        :param on_error: 读取/校验/应用失败及订阅者抛出异常时的回调，接收异常，默认忽略并保留现有配置
+        :param settle: 检测到变化后等待写入完成的时间(秒)
+        """
+        self.config = _unwrap(config)
+        self.path = path
+        self.expect = expect
+        self.interval = interval
+        self.loop = loop
+        self.on_error = on_error
+        self.settle = settle
+        self.reloads = 0
+        # 路径 -> [回调]
+        self._subscribers = {}
+        self._signature = _file_signature(path)
+        self._stop = threading.Event()
+        self._wakeup = os.pipe()
+        # 在监听线程中(如订阅者内)调用close时，由监听线程退出时关闭管道
+        self._close_pipe = False
+        try:
+            self._inotify = _Inotify(os.path.dirname(os.path.abspath(path)))
+        except OSError:
+            self._inotify = None
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, path: Union[str, tuple], callback) -> None:
+        """
+        订阅某路径的变化，该路径、其子路径或父路径变化时调用callback(路径, 新值)，每次重新读取最多调用一次
+        :param path: e.g. 'database.port' / ('database', 'port')，''为整个配置
+        """
+        if isinstance(path, str):
+            path = tuple(path.split('.')) if path else ()
+        self._subscribers.setdefault(path, []).append(callback)
+
+    def close(self) -> None:
+        """
+        停止监听
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if threading.current_thread() is self._thread:
+            self._close_pipe = True
+            return
+        os.write(self._wakeup[1], b'\0')
+        self._thread.join()
+        # 线程退出后再关闭，避免写入已关闭(或被复用)的fd
+        self._close_wakeup()
+
+    def _close_wakeup(self) -> None:
+        for fd in self._wakeup:
+            os.close(fd)
+
+    def _wait(self) -> None:
+        if self._inotify is not None:
+            self._inotify.wait(self._wakeup[0], self.interval)
+        else:
+            self._stop.wait(self.interval)
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                self._wait()
+                if self._stop.is_set():
+                    break
+                signature = _file_signature(self.path)
+                if signature is None or signature == self._signature:
+                    continue
+                self._stop.wait(self.settle)
+                self._signature = _file_signature(self.path)
+                try:
+                    self.reload()
+                except Exception as err:
+                    # 异常不能结束监听线程
+                    self._error(err)
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+            if self._close_pipe:
+                self._close_wakeup()
+
+    def _error(self, err: Exception) -> None:
+        """
+        将异常交给on_error，on_error自身的异常忽略
+        """
+        if self.on_error is not None:
+            try:
+                self.on_error(err)
+            except Exception:
+                pass
+
+    def reload(self) -> None:
+        """
+        重新读取并校验，在事件循环(如有)中应用变化
+        """
+        try:
+            data = load_file(self.path)
+            if self.expect:
+                try:
+                    data = compile_expect(self.expect)(data)
+                except ConfigError as err:
+                    raise ConfigError('%s config error %s: %s' % (err.expect, err.k, err.reason))
+                data = data.dump() if isinstance(data, Propagate) else data
+        except Exception as err:
+            self._error(err)
+            return
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._apply, data)
+        else:
+            self._apply(data)
+
+    def _apply(self, data) -> None:
+        if type(data) is not (dict if isinstance(self.config, dict) else list):
+            self._error(TypeError('config type changed to %s' % type(data).__name__))
+            return
+        # 应用期间持有同步上下文的锁，同步暂停，不会写出修改了一半的配置
+        context = self.config._context
+        try:
+            with getattr(context, '_lock', None) or nullcontext():
+                changed = apply_diff(self.config, data)
+        except Exception as err:
+            self._error(err)
+            return
+        self.reloads += 1
+        if changed:
+            self._notify(changed)
+
+    def _notify(self, changed: list) -> None:
+        for path, callbacks in self._subscribers.items():
+            for c in changed:
+                n = min(len(c), len(path))
+                if c[:n] == path[:n]:
+                    break
             else:
-                raise TypeError(f'not support config file type {path}')
+                continue
+            value = self.config
+            try:
+                for k in path:
+                    value = value[k]
+            except (KeyError, IndexError, TypeError):
+                value = None
+            for callback in callbacks:
+                try:
+                    callback('.'.join(map(str, path)), value)
+                except Exception as err:
+                    self._error(err)
+
+
+def watch(config: Propagate, path: str = None, expect: Any = None, interval: float = 1.0, loop=None,
+          on_error=None) -> Watcher:
+    """
+    监听配置文件，变化时原地更新配置，见Watcher
+    e.g. watcher = watch(config, 'config/config.yaml', expect=Config); watcher.subscribe('database', callback)
+    :param path: 配置文件路径，配置已同步到文件时默认为同步的文件
+    """
+    config = _unwrap(config)
+    if path is None:
+        context = config._context
+        if not isinstance(context, SyncContext):
+            raise ValueError('watch need path')
+        path = context.path
+    return Watcher(config, resolve_path(path), expect=expect, interval=interval, loop=loop, on_error=on_error)
 
-    config._father(PropagateCallback(config, write))
-    config._propagate()
 
+class LazyConfig:
+    """
+    延迟加载的配置，首次访问时才调用read_config读取
+    可用preload方法提前加载
+    """
 
-def sync(config, path: str = 'config', raw_path: str = None):
-    path = raw_path or os.path.join('config', path)
-    _sync(config, path)
+    def __init__(self, *args, **kwargs):
+        """
+        :param args: read_config参数
+        :param kwargs: read_config参数
+        """
+        object.__setattr__(self, '_args', (args, kwargs))
+        object.__setattr__(self, '_config', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def preload(self):
+        """
+        加载配置
+        :return: 配置对象
+        """
+        config = self._config
+        if config is None:
+            with self._lock:
+                config = self._config
+                if config is None:
+                    args, kwargs = self._args
+                    config = read_config(*args, **kwargs)
+                    object.__setattr__(self, '_config', config)
+        return config
+
+    def __getattr__(self, key):
+        return getattr(self.preload(), key)
+
+    def __setattr__(self, key, value):
+        setattr(self.preload(), key, value)
+
+    def __getitem__(self, key):
+        return self.preload()[key]
+
+    def __setitem__(self, key, value):
+        self.preload()[key] = value
+
+    def __contains__(self, key):
+        return key in self.preload()
+
+    def __iter__(self):
+        return iter(self.preload())
+
+    def __len__(self):
+        return len(self.preload())
+
+    def __eq__(self, other):
+        return self.preload() == other
+
+    def __repr__(self):
+        return repr(self.preload())
+
+
+def _unwrap(config):
+    """
+    LazyConfig加载并返回实际配置对象，其余原样返回
+    """
+    return config.preload() if isinstance(config, LazyConfig) else config
 
 
 class Config:
@@ -560,4 +2594,4 @@ class Config:
     pass
 
 
-config: Config = read_config(raw_path='config', expect=Config)
+config: Config = LazyConfig(raw_path='config', expect=Config)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark公共方法
+db.py 以相对路径导入 config.py，因此在临时目录中组装 standard 包后导入
+数据库连接由环境变量 DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME 指定，需为可写的测试库
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def database_config() -> dict:
+    return {
+        'host': os.environ.get('DB_HOST', '127.0.0.1'),
+        'port': int(os.environ.get('DB_PORT', 3306)),
+        'user': os.environ.get('DB_USER', 'root'),
+        'password': os.environ.get('DB_PASSWORD', ''),
+        'db': os.environ.get('DB_NAME', 'benchmark'),
+        'default': True,
+    }
+
+
+def load_db_module():
+    """
+    导入 standard.db，配置文件中仅包含 database_config()
+    :return: db模块
+    """
+    tmp = tempfile.mkdtemp()
+    pkg = os.path.join(tmp, 'standard')
+    os.mkdir(pkg)
+    open(os.path.join(pkg, '__init__.py'), 'w').close()
+    shutil.copy(os.path.join(ROOT, 'config', 'config.py'), pkg)
+    shutil.copy(os.path.join(ROOT, 'db', 'db.py'), pkg)
+    with open(os.path.join(tmp, 'config.json'), mode='wt', encoding='utf-8') as f:
+        json.dump({'database': database_config()}, f)
+
+    cwd = os.getcwd()
+    sys.path.insert(0, tmp)
+    os.chdir(tmp)
+    try:
+        from standard import db
+        db.config.preload()
+    finally:
+        os.chdir(cwd)
+    return db
+
+
+async def timed(coro) -> float:
+    """
+    :return: 协程的耗时(秒)
+    """
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+def report(name: str, seconds: float, base: float = None, rows: int = None):
+    line = '%-40s %10.3f ms' % (name, seconds * 1000)
+    if rows:
+        line += '  %10.0f rows/s' % (rows / seconds)
+    if base:
+        line += '  x%.2f' % (base / seconds)
+    print(line)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+DBConn.insert 逐行插入与 insert_many 批量插入的吞吐对比
+需要可连接的 MySQL/MariaDB，见 common.py
+python insert_many.py [行数]  默认 100000
+"""
+
+import sys
+import asyncio
+
+from common import load_db_module, timed, report
+
+db = load_db_module()
+
+TABLE = 'benchmark_insert_many'
+INSERT = 'INSERT INTO ' + TABLE + ' (name, value, note) VALUES (%s, %s, %s)'
+
+
+async def reset():
+    async with db.DBConn() as conn:
+        await conn.cursor.execute('DROP TABLE IF EXISTS ' + TABLE)
+        await conn.cursor.execute('CREATE TABLE ' + TABLE + ' (id INT AUTO_INCREMENT PRIMARY KEY, '
+                                  'name VARCHAR(64), value INT, note VARCHAR(255))')
+
+
+async def per_row(rows):
+    async with db.DBConn() as conn:
+        for row in rows:
+            await conn.insert(INSERT, row)
+
+
+async def batched(rows, batch_size):
+    async with db.DBConn() as conn:
+        await conn.insert_many(INSERT, rows, batch_size=batch_size)
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = [('name_%d' % i, i, 'note %d' % i * 4) for i in range(n)]
+
+    await reset()
+    base = await timed(per_row(rows))
+    report('insert per row', base, rows=n)
+    for batch_size in (100, 1000, 10000):
+        await reset()
+        report('insert_many batch_size=%d' % batch_size, await timed(batched(rows, batch_size)), base, rows=n)
+
+    async with db.DBConn() as conn:
+        await conn.cursor.execute('DROP TABLE ' + TABLE)
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
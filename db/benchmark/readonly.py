@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+只读块的耗时及省去的往返数对比: 默认 DBConn (读后提交) / DBConn(readonly=True) (自动提交，无需提交)
+以及只读块与普通块交替(共用连接池，每次切换autocommit多一次往返)
+省去的往返数 = 省去的COMMIT数 - autocommit切换数
+需要可连接的 MySQL/MariaDB，见 common.py
+python readonly.py [块数]  默认 2000
+"""
+
+import sys
+import asyncio
+
+from common import load_db_module, timed, report
+
+db = load_db_module()
+
+TABLE = 'benchmark_readonly'
+
+
+async def setup():
+    async with db.DBConn() as conn:
+        await conn.cursor.execute('DROP TABLE IF EXISTS ' + TABLE)
+        await conn.cursor.execute('CREATE TABLE ' + TABLE + ' (id INT PRIMARY KEY, name VARCHAR(64)) ENGINE=InnoDB')
+        await conn.insert_many('INSERT INTO ' + TABLE + ' (id, name) VALUES (%s, %s)',
+                               [(i, 'name_%d' % i) for i in range(100)])
+
+
+async def blocks(n: int, mode: str):
+    for i in range(n):
+        readonly = mode == 'readonly' or mode == 'mixed' and i % 2 == 1
+        async with db.DBConn(readonly=readonly) as conn:
+            await conn.fetch_by_pk('SELECT * FROM ' + TABLE + ' WHERE id = %s', i % 100)
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    await setup()
+    await db.init_all()
+
+    base = None
+    for mode in ('normal', 'readonly', 'mixed'):
+        before = dict(db.transaction_stats)
+        seconds = await timed(blocks(n, mode))
+        stats = {k: v - before[k] for k, v in db.transaction_stats.items()}
+        saved = stats['commits_skipped'] - stats['autocommit_switches']
+        report('%s (%+.2f round-trips saved/block)' % (mode, saved / n), seconds, base)
+        base = base or seconds
+
+    async with db.DBConn() as conn:
+        await conn.cursor.execute('DROP TABLE ' + TABLE)
+    await db.close_all()
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
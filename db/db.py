@@ -4,8 +4,15 @@ StandardLibrary v1.2
 异步mysql数据库
 """
 
+import re
+import time
 import asyncio
+import weakref
 import aiomysql
+from decimal import Decimal
+from typing import Optional
+from collections import OrderedDict, namedtuple
+from contextlib import asynccontextmanager
 
 from .config import config
 
@@ -25,6 +32,17 @@ class DBConfig:
     mark: str = ''
     disable: bool = False
 
+    # 空闲超过ping_idle秒的连接在取出时ping，存活超过max_lifetime秒的连接在取出时重建
+    ping_idle: float = 30
+    max_lifetime: float = 3600
+
+    # 从库，每项为dict，未填写的项与主库相同
+    # 读操作按balance(round_robin/least_outstanding)分配到从库，连接失败的从库在eject_seconds秒内不再使用
+    replicas: list = []
+    balance: str = 'round_robin'
+    eject_seconds: float = 30
+    autocommit: bool = False
+
     def __init__(self, **kwargs):
         self.host = kwargs.get('host', '127.0.0.1')
         self.port = kwargs.get('port', 3306)
@@ -39,6 +57,25 @@ class DBConfig:
         self.default = kwargs.get('default', False)
         self.mark = kwargs.get('mark') or self.db
 
+        self.ping_idle = kwargs.get('ping_idle', 30)
+        self.max_lifetime = kwargs.get('max_lifetime', 3600)
+
+        self.replicas = list(kwargs.get('replicas') or [])
+        self.balance = kwargs.get('balance', 'round_robin')
+        if self.balance not in ('round_robin', 'least_outstanding'):
+            raise ValueError(f'unknown balance {self.balance}')
+        self.eject_seconds = kwargs.get('eject_seconds', 30)
+        self.autocommit = kwargs.get('autocommit', False)
+        self._kwargs = kwargs
+
+    def replica_configs(self) -> list:
+        """
+        :return: 从库配置，mark为 主库mark/replica序号，读操作不开启事务
+        """
+        return [DBConfig(**{**self._kwargs, **replica, 'mark': f'{self.mark}/replica{i}', 'replicas': [],
+                            'default': False, 'autocommit': True})
+                for i, replica in enumerate(self.replicas)]
+
     @property
     def params(self):
         return {
@@ -50,92 +87,1077 @@ class DBConfig:
 
             'minsize': self.minsize,
             'maxsize': self.maxsize,
-            'charset': self.charset
+            'charset': self.charset,
+            'autocommit': self.autocommit,
         }
 
 
+class Replicas:
+    """
+    一个数据库的从库集合，负责选择从库及健康剔除
+    """
+
+    def __init__(self, config: DBConfig, marks: list):
+        self.marks = marks
+        self.balance = config.balance
+        self.eject_seconds = config.eject_seconds
+        # 从库mark -> 正在使用的连接数
+        self.outstanding = {mark: 0 for mark in marks}
+        # 从库mark -> 恢复使用的时间
+        self.ejected = {}
+        self._next = 0
+
+    def choose(self) -> Optional[str]:
+        """
+        :return: 从库mark，全部被剔除时为None
+        """
+        if self.ejected:
+            now = time.monotonic()
+            for mark, until in list(self.ejected.items()):
+                if until <= now:
+                    del self.ejected[mark]
+        marks = [mark for mark in self.marks if mark not in self.ejected] if self.ejected else self.marks
+        if not marks:
+            return None
+        if self.balance == 'least_outstanding':
+            return min(marks, key=self.outstanding.__getitem__)
+        self._next += 1
+        return marks[self._next % len(marks)]
+
+    def eject(self, mark: str) -> None:
+        self.ejected[mark] = time.monotonic() + self.eject_seconds
+
+
+# 默认数据库标识，读取配置后确定，使用default_mark()获取
 default = ''
+_loaded = False
+# 数据库标识 -> 连接池，首次使用时创建，见get_pool
 g_conn_pool = {}
+# 数据库标识 -> 创建中的连接池
+_pool_tasks = {}
+g_db_config = {}
+# 主库mark -> Replicas
+g_replicas = {}
+
+# 连接健康检查计数
+# pings: 取出时ping的次数 / pings_avoided: 省去的ping次数 / recycled: 超过存活时间重建的连接数
+# retries: 连接断开后重试读操作的次数
+health = {'pings': 0, 'pings_avoided': 0, 'recycled': 0, 'retries': 0}
+
+# 事务计数
+# readonly: 只读DBConn数 / commits_skipped: 未开启事务而省去的COMMIT数(即省去的往返数)
+# rollbacks: 异常或commit=False时的回滚数 / savepoints: 嵌套事务(保存点)数
+# autocommit_switches: 连接在只读/普通块间切换autocommit的次数(每次多一次往返)
+transaction_stats = {'readonly': 0, 'commits_skipped': 0, 'rollbacks': 0, 'savepoints': 0, 'autocommit_switches': 0}
+
+# 连接断开的错误码: 2006 server has gone away / 2013 lost connection / 2055 lost connection (system error)
+RETRY_ERRORS = frozenset((2006, 2013, 2055))
+
+# 连接 -> 首次取出的时间，用于计算存活时间
+_conn_born = weakref.WeakKeyDictionary()
+
+# insert_many 单条语句的最大字节数，需小于服务端 max_allowed_packet
+MAX_STATEMENT_LENGTH = 1024 * 1024
+
+# stream 逐行返回时每次从服务端读取的行数
+STREAM_CHUNK = 1000
+
+# INSERT/REPLACE ... VALUES (%s, ...) [ON DUPLICATE KEY UPDATE ...]
+RE_INSERT_VALUES = re.compile(
+    r"\s*((?:INSERT|REPLACE)\s.+\sVALUES?\s+)"
+    r"(\(\s*(?:%s|%\(.+\)s)\s*(?:,\s*(?:%s|%\(.+\)s)\s*)*\))"
+    r"(\s*(?:ON DUPLICATE.*)?);?\s*\Z",
+    re.IGNORECASE | re.DOTALL)
 
 
 async def init_pool(config: DBConfig):
     pool = await aiomysql.create_pool(**config.params)
     g_conn_pool[config.mark] = pool
+    return pool
+
 
+def load_database_config() -> None:
+    """
+    读取配置中的数据库，首次使用时自动调用，不会建立连接
+    """
+    global default, _loaded
+    if _loaded:
+        return
 
-if isinstance(config.database, dict):
-    database_config = [] if config.database.disable else [config.database]
-else:
-    database_config = [c for c in config.database if not c.disable]
+    database = config.database
+    if isinstance(database, dict):
+        database_config = [] if database.get('disable') else [database]
+    else:
+        database_config = [c for c in database if not c.get('disable')]
 
-if database_config == 1:
-    default = DBConfig(**database_config[0]).mark
+    configs, replicas, default_mark = {}, {}, ''
+    if len(database_config) == 1:
+        default_mark = DBConfig(**database_config[0]).mark
 
-for conf in database_config:
-    conf = DBConfig(**conf)
-    if conf.mark in g_conn_pool:
-        raise ValueError(f'exist database {conf.mark}')
-    g_conn_pool[conf.mark] = init_pool(conf)
+    for conf in database_config:
+        conf = DBConfig(**conf)
+        if conf.mark in configs:
+            raise ValueError(f'exist database {conf.mark}')
+        configs[conf.mark] = conf
+        replica_configs = conf.replica_configs()
+        for replica in replica_configs:
+            configs[replica.mark] = replica
+        if replica_configs:
+            replicas[conf.mark] = Replicas(conf, [replica.mark for replica in replica_configs])
 
-    if conf.default:
-        if default != '':
-            raise ValueError('default database already exists')
-        default = conf.mark
+        if conf.default:
+            if default_mark != '' and len(database_config) > 1:
+                raise ValueError('default database already exists')
+            default_mark = conf.mark
+
+    g_db_config.update(configs)
+    g_replicas.update(replicas)
+    default = default_mark
+    _loaded = True
+
+
+def default_mark() -> str:
+    """
+    :return: 默认数据库标识
+    """
+    load_database_config()
+    return default
+
+
+async def get_pool(mark: str) -> aiomysql.Pool:
+    """
+    获取连接池，首次使用时创建，并发的首次使用只创建一次
+    :param mark: 数据库标识
+    """
+    pool = g_conn_pool.get(mark)
+    if pool is not None:
+        return pool
+    load_database_config()
+    task = _pool_tasks.get(mark)
+    if task is None:
+        task = _pool_tasks[mark] = asyncio.ensure_future(init_pool(g_db_config[mark]))
+    try:
+        return await asyncio.shield(task)
+    finally:
+        # 创建失败时下次使用重新创建
+        if task.done() and _pool_tasks.get(mark) is task:
+            del _pool_tasks[mark]
+
+
+async def init_all() -> None:
+    """
+    创建所有数据库(含从库)的连接池，用于预热
+    """
+    load_database_config()
+    await asyncio.gather(*[get_pool(mark) for mark in g_db_config])
+
+
+async def close_all() -> None:
+    """
+    关闭所有连接池，等待连接关闭
+    """
+    for task in list(_pool_tasks.values()):
+        await asyncio.wait([task])
+    pools = list(g_conn_pool.values())
+    g_conn_pool.clear()
+    for pool in pools:
+        pool.close()
+    for pool in pools:
+        await pool.wait_closed()
+
+
+async def acquire(mark: str):
+    """
+    从连接池取出连接，按DBConfig的策略检查连接
+    存活超过max_lifetime的连接关闭后重新取出，空闲超过ping_idle的连接ping(断开时重连)，其余直接使用
+    :param mark: 数据库标识
+    :return: 连接
+    """
+    pool, conf = await get_pool(mark), g_db_config[mark]
+    while True:
+        conn = await pool.acquire()
+        now = asyncio.get_event_loop().time()
+        born = _conn_born.setdefault(conn, now)
+        if now - born > conf.max_lifetime:
+            health['recycled'] += 1
+            del _conn_born[conn]
+            conn.close()
+            await pool.release(conn)
+            continue
+        if now - conn.last_usage > conf.ping_idle:
+            health['pings'] += 1
+            await conn.ping(reconnect=True)
+        else:
+            health['pings_avoided'] += 1
+        return conn
+
+
+class Metrics:
+    """
+    连接池/查询指标，enabled为False时不记录
+    acquire: 取出连接的等待时间 / hold: 连接占用时间 / query: 按SQL指纹统计的执行时间及行数
+    耗时统计均为 [次数, 总耗时, 最大耗时]，query额外记录行数
+    每个数据库最多记录max_queries个指纹，超出的计入'(other)'
+    """
+    max_queries = 1000
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.acquire = {}
+        self.hold = {}
+        self.query = {}
+
+    @staticmethod
+    def _add(stats: dict, key, seconds: float) -> list:
+        stat = stats.get(key)
+        if stat is None:
+            stat = stats[key] = [0, 0.0, 0.0]
+        stat[0] += 1
+        stat[1] += seconds
+        if seconds > stat[2]:
+            stat[2] = seconds
+        return stat
+
+    def record_acquire(self, mark: str, seconds: float) -> None:
+        self._add(self.acquire, mark, seconds)
+
+    def record_hold(self, mark: str, seconds: float) -> None:
+        self._add(self.hold, mark, seconds)
+
+    def record_query(self, mark: str, sql, seconds: float, rows: int) -> None:
+        stats = self.query.get(mark)
+        if stats is None:
+            stats = self.query[mark] = {}
+        # 按指纹记录，字面量不同的语句不会无限新增键
+        key = fingerprint(sql)
+        stat = stats.get(key)
+        if stat is None:
+            if len(stats) >= self.max_queries:
+                key = '(other)'
+                stat = stats.get(key)
+            if stat is None:
+                stat = stats[key] = [0, 0.0, 0.0, 0]
+        stat[0] += 1
+        stat[1] += seconds
+        if seconds > stat[2]:
+            stat[2] = seconds
+        if rows > 0:
+            stat[3] += rows
+
+    def snapshot(self) -> dict:
+        """
+        :return: 指标快照，查询按SQL指纹
+        """
+        def timing(stat):
+            return {'count': stat[0], 'sum': stat[1], 'max': stat[2]}
 
-asyncio.get_event_loop().run_until_complete(asyncio.gather(*[pool for pool in g_conn_pool.values()]))
+        queries = {mark: {sql: dict(timing(stat), rows=stat[3]) for sql, stat in stats.items()}
+                   for mark, stats in self.query.items()}
+
+        pools = {}
+        for mark, pool in g_conn_pool.items():
+            if isinstance(pool, aiomysql.Pool):
+                pools[mark] = {'size': pool.size, 'free': pool.freesize, 'maxsize': pool.maxsize}
+
+        return {
+            'acquire': {mark: timing(stat) for mark, stat in self.acquire.items()},
+            'hold': {mark: timing(stat) for mark, stat in self.hold.items()},
+            'query': queries,
+            'pool': pools,
+            'health': dict(health),
+        }
+
+    def prometheus(self) -> str:
+        """
+        :return: Prometheus 文本格式的指标
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def summary(name, stats, labels):
+            lines.append('# TYPE %s summary' % name)
+            for key, stat in stats:
+                label = _labels(labels(key))
+                lines.append('%s_count%s %d' % (name, label, stat['count']))
+                lines.append('%s_sum%s %r' % (name, label, stat['sum']))
+
+        summary('db_acquire_seconds', snapshot['acquire'].items(), lambda mark: {'mark': mark})
+        summary('db_hold_seconds', snapshot['hold'].items(), lambda mark: {'mark': mark})
+        queries = [((mark, sql), stat) for mark, stats in snapshot['query'].items() for sql, stat in stats.items()]
+        summary('db_query_seconds', queries, lambda key: {'mark': key[0], 'sql': key[1]})
+        lines.append('# TYPE db_query_rows_total counter')
+        for (mark, sql), stat in queries:
+            lines.append('db_query_rows_total%s %d' % (_labels({'mark': mark, 'sql': sql}), stat['rows']))
+
+        for field in ('size', 'free', 'maxsize'):
+            lines.append('# TYPE db_pool_%s gauge' % field)
+            for mark, pool in snapshot['pool'].items():
+                lines.append('db_pool_%s%s %d' % (field, _labels({'mark': mark}), pool[field]))
+
+        lines.append('# TYPE db_health_total counter')
+        for kind, count in snapshot['health'].items():
+            lines.append('db_health_total%s %d' % (_labels({'kind': kind}), count))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels: dict) -> str:
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for k, v in labels.items())
+
+
+# 字面量/参数占位符替换为?，IN/VALUES 列表合并，空白合并
+_RE_FINGERPRINT = (
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\""), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+_fingerprints = {}
+
+
+def fingerprint(sql) -> str:
+    """
+    SQL指纹，字面量与参数不同的同一语句指纹相同
+    e.g. SELECT * FROM t WHERE id IN (1, 2, 3) -> SELECT * FROM t WHERE id IN (...)
+    """
+    r = _fingerprints.get(sql)
+    if r is None:
+        r = sql.decode(errors='replace') if isinstance(sql, bytes) else sql
+        for pattern, repl in _RE_FINGERPRINT:
+            r = pattern.sub(repl, r)
+        r = r.strip()
+        if len(_fingerprints) > 10000:
+            _fingerprints.clear()
+        _fingerprints[sql] = r
+    return r
+
+
+metrics = Metrics()
+
+
+# 读语句的词: 字符串、(带库名的)标识符、括号、逗号，其余单个字符
+# 写语句的表: INSERT/REPLACE INTO, UPDATE, DELETE FROM 后的表名
+_RE_SQL_TOKEN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\""
+                           r'|(?:`[^`]*`|\w+)(?:\.(?:`[^`]*`|\w+))*|[(),]|\S')
+# 结束 FROM 子句的关键字
+_FROM_END = {'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'UNION', 'EXCEPT', 'INTERSECT', 'WINDOW', 'FOR',
+             'LOCK', 'INTO', 'PROCEDURE'}
+_RE_WRITE_TABLE = re.compile(
+    r'^\s*(?:(?:INSERT|REPLACE)(?:\s+(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE))*\s+(?:INTO\s+)?'
+    r'|UPDATE(?:\s+(?:LOW_PRIORITY|IGNORE))*\s+|DELETE(?:\s+(?:LOW_PRIORITY|QUICK|IGNORE))*\s+FROM\s+)'
+    r'((?:`?\w+`?\.)?`?\w+`?)', re.IGNORECASE)
+
+
+def _table_name(name: str) -> str:
+    return name.replace('`', '').rsplit('.', 1)[-1].lower()
+
+
+def read_tables(sql) -> frozenset:
+    """
+    读语句涉及的表: FROM/JOIN 后以逗号分隔的表，及各层子查询中的表
+    无法可靠确定时(如 FROM 后为数字/关键字、括号不匹配)返回空集，该语句不缓存
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    tables = set()
+    # 每层括号: [FROM子句中, 期望表名]
+    scopes = [[False, False]]
+    for token in _RE_SQL_TOKEN.findall(sql):
+        scope = scopes[-1]
+        if token == '(':
+            # 期望表名时为派生表/子查询或括号中的表列表 e.g. JOIN (t2, t3)
+            scopes.append([scope[1], scope[1]])
+            scope[1] = False
+        elif token == ')':
+            scopes.pop()
+            if not scopes:
+                return frozenset()
+        elif scope[1]:
+            if token.upper() == 'SELECT':
+                # 子查询
+                scope[0] = scope[1] = False
+            elif token[0] in '`_' or token[0].isalpha() and token.upper() != 'LATERAL':
+                tables.add(_table_name(token))
+                scope[1] = False
+            else:
+                return frozenset()
+        elif token == ',':
+            scope[1] = scope[0]
+        elif token[0] == '`' or token[0] == '_' or token[0].isalpha():
+            word = token.upper()
+            if word == 'FROM' or word == 'JOIN':
+                scope[0] = scope[1] = True
+            elif word in _FROM_END:
+                scope[0] = False
+    if len(scopes) != 1 or scopes[0][1]:
+        return frozenset()
+    return frozenset(tables)
+
+
+def write_table(sql) -> Optional[str]:
+    m = _RE_WRITE_TABLE.match(sql)
+    return _table_name(m.group(1)) if m else None
+
+
+class ResultCache:
+    """
+    fetch_one/fetch_by_pk 的结果缓存，enabled为False时不使用
+    键为 (数据库, 空白合并后的SQL, 参数)，按ttl过期，超过maxsize时淘汰最久未使用的结果
+    同一键并发未命中时只查询一次，其余等待该次结果
+    同一进程内通过 DBConn 写入某表时，该表相关的缓存失效
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 1.0):
+        self.enabled = False
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0}
+        # 键 -> (过期时间, 结果, 表)
+        self._entries = OrderedDict()
+        # (数据库, 表) -> 键集合
+        self._tables = {}
+        # (数据库, 表) -> 失效次数，查询期间表失效时不缓存查询结果
+        self._generations = {}
+        # 键 -> 查询中的Future
+        self._inflight = {}
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tables.clear()
+
+    @staticmethod
+    def _key(mark: str, sql: str, params, one: bool):
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        elif isinstance(params, list):
+            params = tuple(params)
+        key = (mark, ' '.join(sql.split()), params, one)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    async def get(self, mark: str, sql: str, params, one: bool, load):
+        """
+        :param load: 未命中时调用的查询协程函数
+        :return: 查询结果的副本
+        """
+        key = self._key(mark, sql, params, one)
+        if key is None:
+            return await load()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return _copy_result(entry[1])
+            self._remove(key)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            try:
+                return _copy_result(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                # 查询的协程被取消时自行查询
+                if not future.cancelled():
+                    raise
+                return _copy_result(await load())
+
+        self.stats['misses'] += 1
+        tables = read_tables(sql)
+        generations = [self._generations.get((mark, table), 0) for table in tables]
+        future = self._inflight[key] = asyncio.get_event_loop().create_future()
+        try:
+            result = await load()
+        except Exception as err:
+            future.set_exception(err)
+            # 无等待者时避免 exception was never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if tables and generations == [self._generations.get((mark, table), 0) for table in tables]:
+                self._store(key, result, mark, tables)
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                future.cancel()
+        return _copy_result(result)
+
+    def _store(self, key, result, mark: str, tables: frozenset) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, result, tables)
+        for table in tables:
+            self._tables.setdefault((mark, table), set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key) -> None:
+        _, _, tables = self._entries.pop(key)
+        for table in tables:
+            keys = self._tables.get((key[0], table))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[(key[0], table)]
+
+    def invalidate(self, mark: str, table: str) -> None:
+        """
+        使某表相关的缓存失效
+        """
+        self._generations[(mark, table)] = self._generations.get((mark, table), 0) + 1
+        keys = self._tables.pop((mark, table), ())
+        if keys:
+            self.stats['invalidations'] += len(keys)
+        for key in keys:
+            if key in self._entries:
+                self._remove(key)
+
+
+def _copy_result(result):
+    if isinstance(result, dict):
+        return dict(result)
+    elif isinstance(result, (list, tuple)):
+        return [dict(row) if isinstance(row, dict) else row for row in result]
+    return result
+
+
+result_cache = ResultCache()
 
 
 # ---- 使用 async with 的方式来优化代码, 利用 __aenter__ 和 __aexit__ 控制async with的进入和退出处理
 class DBConn(object):
-    def __init__(self, db: str = default, commit=True):
+    def __init__(self, db: str = None, commit=True, transaction=False, readonly=False):
         """
-        :param commit: 是否在最后提交事务(设置为False的时候方便单元测试)
+        :param db: 数据库标识，默认为默认数据库
+        :param commit: 是否在最后提交事务(设置为False的时候方便单元测试，退出时回滚)
+        :param transaction: 显式事务，读操作也使用主库
+        :param readonly: 只读，取出的连接切换为自动提交，退出时无需提交，不能执行写操作
         """
-        self.db = db
+        self.db = db or default_mark()
         self._commit = commit
+        self._transaction = transaction
+        self._readonly = readonly
 
     async def __aenter__(self):
-        # 从连接池获取数据库连接
-        conn = await g_conn_pool[self.db].acquire()
-        await conn.ping(reconnect=True)
-        cursor: aiomysql.Cursor = await conn.cursor(aiomysql.cursors.DictCursor)
-        conn.autocommit = False
+        # 主库连接，有从库时在首次需要主库(写操作、显式事务、流式读取、从库不可用等)时才取出
+        self._conn = None
+        self._cursor = None
+        self._entered = None
+        if self._readonly:
+            transaction_stats['readonly'] += 1
+        if self.db not in g_replicas or self._transaction:
+            await self._primary()
 
-        self._conn = conn
-        self._cursor = cursor
+        self._streams = set()
+        # 是否执行过写操作，执行过时连接断开后不再重试读操作，读操作也不再使用从库
+        self._written = False
+        # 写入过的表，提交后再次使缓存失效
+        self._written_tables = set()
+        # 从库mark及连接，首次读操作时取出
+        self._replica = None
+        self._replica_conn = None
+        self._replica_cursor = None
+        self._savepoint = 0
         return self
 
-    async def __aexit__(self, *exc_info):
-        # 提交事务
-        if self._commit:
-            await self._conn.commit()
-        # 在退出的时候自动关闭连接和cursor
-        await self._cursor.close()
-        await g_conn_pool[self.db].release(self._conn)
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        try:
+            # 关闭未读完的流式游标，否则连接无法继续使用
+            for stream in list(self._streams):
+                await stream.close()
+            # 未取出主库连接或未开启事务(只读、未执行语句)时无需提交，出现异常或commit=False时回滚
+            # 仍在事务中的连接放回连接池时会被关闭
+            if self._conn is None or not self._conn.get_transaction_status():
+                transaction_stats['commits_skipped'] += 1
+            elif self._commit and exc_type is None:
+                await self._conn.commit()
+            else:
+                transaction_stats['rollbacks'] += 1
+                await self._conn.rollback()
+        finally:
+            # 提交/回滚失败(如连接已断开)时也要归还主库及从库连接
+            for table in self._written_tables:
+                result_cache.invalidate(self.db, table)
+            try:
+                if self._conn is not None:
+                    try:
+                        await self._cursor.close()
+                    finally:
+                        await g_conn_pool[self.db].release(self._conn)
+            finally:
+                await self._release_replica()
+            if self._entered is not None:
+                metrics.record_hold(self.db, time.perf_counter() - self._entered)
 
     # ========= 一系列封装的方法
+    async def _primary(self) -> aiomysql.Cursor:
+        """
+        取出主库连接(已取出时直接返回)
+        :return: 主库游标
+        """
+        if self._conn is not None:
+            return self._cursor
+        if metrics.enabled:
+            start = time.perf_counter()
+            conn = await acquire(self.db)
+            self._entered = time.perf_counter()
+            metrics.record_acquire(self.db, self._entered - start)
+        else:
+            conn = await acquire(self.db)
+        try:
+            cursor: aiomysql.Cursor = await conn.cursor(aiomysql.cursors.DictCursor)
+            # 只读块与普通块共用连接池，autocommit与本次需要的不一致时才需要一次往返
+            if conn.get_autocommit() != self._readonly:
+                transaction_stats['autocommit_switches'] += 1
+                await conn.autocommit(self._readonly)
+        except BaseException:
+            await g_conn_pool[self.db].release(conn)
+            raise
+        self._conn = conn
+        self._cursor = cursor
+        return cursor
+
+    async def _reconnect(self):
+        """
+        关闭断开的连接并重连，重新创建游标
+        """
+        self._conn.close()
+        await self._conn.ping(reconnect=True)
+        _conn_born[self._conn] = asyncio.get_event_loop().time()
+        self._cursor = await self._conn.cursor(aiomysql.cursors.DictCursor)
+
+    async def _execute(self, sql, params=None, many=False, source=None, cursor=None, mark=None):
+        """
+        执行语句，开启指标时记录执行时间及行数
+        :param many: 使用executemany
+        :param source: 统计时使用的语句，默认为sql
+        :param cursor: 游标，默认为主库游标
+        :param mark: 统计时使用的数据库，默认为主库
+        """
+        cursor = cursor or await self._primary()
+        execute = cursor.executemany if many else cursor.execute
+        if not metrics.enabled:
+            return await execute(sql, params)
+        start = time.perf_counter()
+        try:
+            return await execute(sql, params)
+        finally:
+            metrics.record_query(mark or self.db, source or sql, time.perf_counter() - start, cursor.rowcount)
+
+    async def _acquire_replica(self):
+        """
+        取出从库连接，连接失败的从库被剔除并尝试下一个
+        :return: 从库游标，无可用从库时为None
+        """
+        replicas = g_replicas[self.db]
+        while self._replica_cursor is None:
+            mark = replicas.choose()
+            if mark is None:
+                return None
+            replicas.outstanding[mark] += 1
+            try:
+                conn = await acquire(mark)
+            except (OSError, aiomysql.OperationalError):
+                replicas.outstanding[mark] -= 1
+                replicas.eject(mark)
+                continue
+            self._replica, self._replica_conn = mark, conn
+            self._replica_cursor = await conn.cursor(aiomysql.cursors.DictCursor)
+        return self._replica_cursor
+
+    async def _release_replica(self, eject=False):
+        if self._replica is None:
+            return
+        replicas = g_replicas[self.db]
+        replicas.outstanding[self._replica] -= 1
+        try:
+            if eject:
+                replicas.eject(self._replica)
+                self._replica_conn.close()
+            else:
+                await self._replica_cursor.close()
+        finally:
+            await g_conn_pool[self._replica].release(self._replica_conn)
+            self._replica = self._replica_conn = self._replica_cursor = None
+
+    async def _read(self, sql, params, one=False):
+        """
+        执行读操作
+        未执行过写操作且不是显式事务时使用从库，从库连接断开时剔除该从库并改用主库
+        主库连接断开时，仅在非显式事务、未执行过写操作且执行前没有进行中的事务时重连并重试一次
+        (事务中之前的读(如 SELECT ... FOR UPDATE)持有的锁与快照在重连后已丢失，不能静默重试)
+        """
+        if self.db in g_replicas and not self._written and not self._transaction:
+            cursor = await self._acquire_replica()
+            if cursor is not None:
+                try:
+                    await self._execute(sql, params, cursor=cursor, mark=self._replica)
+                    return await (cursor.fetchone() if one else cursor.fetchall())
+                except aiomysql.OperationalError as err:
+                    if err.args[0] not in RETRY_ERRORS:
+                        raise
+                await self._release_replica(eject=True)
+
+        await self._primary()
+        retryable = not self._transaction and not self._conn.get_transaction_status()
+        for retry in (False, True):
+            try:
+                await self._execute(sql, params)
+                return await (self.cursor.fetchone() if one else self.cursor.fetchall())
+            except aiomysql.OperationalError as err:
+                if retry or not retryable or self._written or err.args[0] not in RETRY_ERRORS:
+                    raise
+            health['retries'] += 1
+            await self._reconnect()
+
+    def _write(self, sql) -> None:
+        """
+        标记写操作，使写入表的缓存失效
+        """
+        if self._readonly:
+            raise ValueError(f'write in readonly DBConn: {sql}')
+        self._written = True
+        if result_cache.enabled:
+            table = write_table(sql)
+            if table is not None:
+                result_cache.invalidate(self.db, table)
+                self._written_tables.add(table)
+
+    def _cacheable(self) -> bool:
+        return result_cache.enabled and not self._written and not self._transaction
+
     async def insert(self, sql, params=None):
-        await self.cursor.execute(sql, params)
+        self._write(sql)
+        await self._execute(sql, params)
         return self.cursor.lastrowid
 
+    async def insert_many(self, sql, rows, batch_size=1000, max_length=MAX_STATEMENT_LENGTH):
+        """
+        批量插入，INSERT ... VALUES (%s, ...) 会合并为多行VALUES，每批一次往返
+        其他语句按批使用executemany
+        :param sql: 单行插入语句，如 INSERT INTO t (a, b) VALUES (%s, %s)
+        :param rows: 参数序列，每项为tuple/dict
+        :param batch_size: 每批最大行数
+        :param max_length: 每批语句的最大字节数
+        :return: 每批的 (影响行数, 首行自增id)
+        """
+        self._write(sql)
+        m = RE_INSERT_VALUES.match(sql)
+        if m is None:
+            return await self._execute_many(sql, rows, batch_size)
+
+        cursor = await self._primary()
+        encoding = self._conn.encoding
+        prefix = m.group(1).encode(encoding)
+        values = m.group(2)
+        suffix = m.group(3).encode(encoding)
+
+        result = []
+        statement, count = bytearray(prefix), 0
+        for row in rows:
+            value = cursor.mogrify(values, row).encode(encoding)
+            if count and (count >= batch_size or len(statement) + len(value) + len(suffix) + 1 > max_length):
+                result.append(await self._execute_batch(statement + suffix, sql))
+                statement, count = bytearray(prefix), 0
+            if count:
+                statement += b','
+            statement += value
+            count += 1
+        if count:
+            result.append(await self._execute_batch(statement + suffix, sql))
+        return result
+
+    async def _execute_batch(self, statement, sql):
+        await self._execute(bytes(statement), source=sql)
+        return self.cursor.rowcount, self.cursor.lastrowid
+
+    async def _execute_many(self, sql, rows, batch_size):
+        result = []
+        rows = list(rows)
+        for i in range(0, len(rows), batch_size):
+            await self._execute(sql, rows[i:i + batch_size], many=True)
+            result.append((self.cursor.rowcount, self.cursor.lastrowid))
+        return result
+
     async def fetch_one(self, sql, params=None):
-        await self.cursor.execute(sql, params)
-        return await self.cursor.fetchone()
+        if self._cacheable():
+            return await result_cache.get(self.db, sql, params, True, lambda: self._read(sql, params, one=True))
+        return await self._read(sql, params, one=True)
 
     async def fetch_all(self, sql, params=None):
-        await self.cursor.execute(sql, params)
-        return await self.cursor.fetchall()
+        return await self._read(sql, params)
+
+    @asynccontextmanager
+    async def savepoint(self):
+        """
+        嵌套事务，块内出现异常时回滚到块开始时的状态并抛出异常，不影响块外的修改
+        e.g. async with conn.savepoint(): ...
+        """
+        if self._readonly:
+            raise ValueError('savepoint in readonly DBConn')
+        self._savepoint += 1
+        name = 'sp_%d' % self._savepoint
+        transaction_stats['savepoints'] += 1
+        await self._execute('SAVEPOINT ' + name)
+        try:
+            yield self
+        except BaseException:
+            await self._execute('ROLLBACK TO SAVEPOINT ' + name)
+            raise
+        else:
+            await self._execute('RELEASE SAVEPOINT ' + name)
+        finally:
+            self._savepoint -= 1
+
+    def pipeline(self) -> 'Pipeline':
+        """
+        多条语句合并为一次发送，见Pipeline
+        """
+        return Pipeline(self)
+
+    async def _execute_pipeline(self, statements: list, max_length: int) -> list:
+        for sql, _ in statements:
+            if not _RE_SELECT.match(sql):
+                self._write(sql)
+
+        # aiomysql的连接总是开启CLIENT.MULTI_STATEMENTS
+        await self._primary()
+        encoding = self._conn.encoding
+        results, packet, sources = [], bytearray(), []
+        for sql, params in statements:
+            statement = (self.cursor.mogrify(sql, params) if params is not None else sql).encode(encoding)
+            if packet and len(packet) + len(statement) + 1 > max_length:
+                results.extend(await self._execute_packet(packet, sources))
+                packet, sources = bytearray(), []
+            if packet:
+                packet += b';'
+            packet += statement
+            sources.append(sql)
+        if packet:
+            results.extend(await self._execute_packet(packet, sources))
+        return results
+
+    async def _execute_packet(self, packet, sources: list) -> list:
+        await self._execute(bytes(packet), source='; '.join(sources))
+        results = [await self._pipeline_result()]
+        while await self.cursor.nextset():
+            results.append(await self._pipeline_result())
+        return results
+
+    async def _pipeline_result(self) -> 'PipelineResult':
+        rows = await self.cursor.fetchall() if self.cursor.description else []
+        return PipelineResult(list(rows), self.cursor.rowcount, self.cursor.lastrowid)
+
+    async def stream(self, sql, params=None, chunk=None, tuple_row=False):
+        """
+        使用服务端游标(SSDictCursor/SSCursor)流式读取，结果集不会整体缓存在内存中
+        e.g. async for row in conn.stream(sql, params): ...
+        读取完成前同一连接不能执行其他语句，未读完的游标在退出 DBConn 时关闭
+        :param chunk: 为None时逐行返回，否则每次返回最多chunk行的list
+        :param tuple_row: 行为tuple，不生成dict
+        """
+        await self._primary()
+        cursor = await self._conn.cursor(aiomysql.cursors.SSCursor if tuple_row else aiomysql.cursors.SSDictCursor)
+        self._streams.add(cursor)
+        try:
+            await cursor.execute(sql, params)
+            while True:
+                rows = await cursor.fetchmany(chunk or STREAM_CHUNK)
+                if not rows:
+                    break
+                if chunk:
+                    yield rows
+                else:
+                    for row in rows:
+                        yield row
+        finally:
+            self._streams.discard(cursor)
+            await cursor.close()
 
     async def fetch_by_pk(self, sql, pk):
-        await self.cursor.execute(sql, (pk,))
-        return await self.cursor.fetchall()
+        if self._cacheable():
+            return await result_cache.get(self.db, sql, (pk,), False, lambda: self._read(sql, (pk,)))
+        return await self._read(sql, (pk,))
 
     async def update_by_pk(self, sql, params=None):
-        await self.cursor.execute(sql, params)
+        self._write(sql)
+        await self._execute(sql, params)
 
     async def delete(self, sql, params=None):
-        await self.cursor.execute(sql, params)
+        self._write(sql)
+        await self._execute(sql, params)
 
     @property
     def cursor(self):
+        """
+        主库游标，有从库时在首次需要主库前为None
+        """
         return self._cursor
+
+
+_RE_SELECT = re.compile(r'\s*\(?\s*SELECT\b', re.IGNORECASE)
+
+# 每条语句的结果: 行(无结果集时为[]) / 影响行数 / 自增id
+PipelineResult = namedtuple('PipelineResult', ['rows', 'rowcount', 'lastrowid'])
+
+
+class Pipeline:
+    """
+    在同一 DBConn 中排队多条语句，合并为一个多语句包发送，一次往返
+    依赖aiomysql连接默认开启的 CLIENT.MULTI_STATEMENTS
+    e.g. pipe = conn.pipeline(); pipe.add(sql, params); results = await pipe.execute()
+    """
+
+    def __init__(self, conn: 'DBConn'):
+        self._conn = conn
+        self._statements = []
+
+    def add(self, sql: str, params=None) -> 'Pipeline':
+        """
+        :param sql: 单条语句
+        :param params: 参数
+        """
+        self._statements.append((sql, params))
+        return self
+
+    def __len__(self):
+        return len(self._statements)
+
+    async def execute(self, max_length: int = MAX_STATEMENT_LENGTH) -> list:
+        """
+        执行并清空队列，某条语句出错时抛出异常，其后的语句不会执行
+        :param max_length: 每个多语句包的最大字节数，超过时分为多次发送
+        :return: 每条语句的PipelineResult
+        """
+        statements, self._statements = self._statements, []
+        if not statements:
+            return []
+        return await self._conn._execute_pipeline(statements, max_length)
+
+
+# SELECT 列 FROM 表 WHERE 列 = %s
+_RE_FETCH_BY_PK = re.compile(r'^\s*SELECT\s+(.+?)\s+FROM\s+(\S+)\s+WHERE\s+(\S+)\s*=\s*%s\s*;?\s*$',
+                             re.IGNORECASE | re.DOTALL)
+
+
+class PkLoader:
+    """
+    合并并发的按主键查询，同一轮事件循环(或delay秒)内的查询合并为一次 WHERE 列 IN (...) 查询
+    e.g. loader = PkLoader('SELECT * FROM user WHERE id = %s'); rows = await loader.load(1)
+    主键仅支持整数(含整数值的float/Decimal)，结果按整数值分配给各查询，与 fetch_by_pk 相同返回list
+    字符串主键的比较取决于列的排序规则(大小写/尾部空格)，无法在客户端还原，请使用 fetch_by_pk
+    """
+
+    def __init__(self, sql: str, db: str = None, delay: float = 0, max_batch: int = 1000):
+        """
+        :param sql: 形如 SELECT 列 FROM 表 WHERE 列 = %s 的语句
+        :param db: 数据库标识，默认为默认数据库
+        :param delay: 收集查询的时间(秒)，0为同一轮事件循环
+        :param max_batch: 每次查询的最大主键数
+        """
+        m = _RE_FETCH_BY_PK.match(sql)
+        if m is None:
+            raise ValueError(f'not support sql {sql}')
+        columns, table, column = m.groups()
+        # *后不能再跟其他列，_batch_key放在最后
+        self._select = f'SELECT {columns}, {column} AS _batch_key FROM {table} WHERE {column} IN '
+        self.db = db
+        self.delay = delay
+        self.max_batch = max_batch
+        # loads: 查询次数 / batches: 实际查询次数
+        self.stats = {'loads': 0, 'batches': 0}
+        # 整数主键 -> (主键, Future)
+        self._pending = {}
+        self._handle = None
+
+    async def load(self, pk) -> list:
+        """
+        :return: 该主键的行
+        """
+        key = _pk_key(pk)
+        if key is None:
+            raise TypeError(f'PkLoader only supports integer pk, got {pk!r}')
+        self.stats['loads'] += 1
+        waiting = self._pending.get(key)
+        if waiting is None:
+            loop = asyncio.get_event_loop()
+            waiting = self._pending[key] = (pk, loop.create_future())
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._handle is None:
+                self._handle = loop.call_later(self.delay, self._dispatch) if self.delay else \
+                    loop.call_soon(self._dispatch)
+        return _copy_result(await asyncio.shield(waiting[1]))
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            self.stats['batches'] += 1
+            asyncio.ensure_future(self._fetch(pending))
+
+    async def _fetch(self, pending: dict) -> None:
+        sql = self._select + '(%s)' % ', '.join(['%s'] * len(pending))
+        try:
+            async with DBConn(self.db, readonly=True) as conn:
+                rows = await conn.fetch_all(sql, list(pending))
+        except Exception as err:
+            for _, future in pending.values():
+                if not future.done():
+                    future.set_exception(err)
+            return
+        result = {key: [] for key in pending}
+        for row in rows:
+            rows = result.get(_pk_key(row.pop('_batch_key'), True))
+            if rows is not None:
+                rows.append(row)
+        for key, (_, future) in pending.items():
+            if not future.done():
+                future.set_result(result[key])
+
+
+def _pk_key(value, column: bool = False) -> Optional[int]:
+    """
+    主键转为整数，非整数值返回None
+    :param column: 为列值，字符串按服务端的数值比较转换
+    """
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, (float, Decimal)):
+        try:
+            if value == int(value):
+                return int(value)
+        except (OverflowError, ValueError):
+            pass
+        return None
+    if column and isinstance(value, (str, bytes)):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
+
+
+_loaders = {}
+
+
+async def batch_fetch_by_pk(sql: str, pk, db: str = None) -> list:
+    """
+    同 DBConn.fetch_by_pk，但并发的同一语句查询会合并为一次查询，且不占用调用方的连接，见PkLoader
+    :param db: 数据库标识，默认为默认数据库
+    """
+    key = (db or default_mark(), sql)
+    loader = _loaders.get(key)
+    if loader is None:
+        loader = _loaders[key] = PkLoader(sql, db=key[0])
+    return await loader.load(pk)